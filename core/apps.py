@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        # Connects the user cache invalidation, also for management commands like changepassword.
+        from core.services import users  # noqa: F401
@@ -0,0 +1,124 @@
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+
+from core.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the WSGI and ASGI handlers at a given concurrency. Requests are fed "
+        "to the handlers in process, so the numbers exclude any server and network overhead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", default=["/"], help="Paths requested round robin.")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+        parser.add_argument("--email", help="User to log in as, defaults to the first user.")
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by("id")
+        user = users.filter(email=options["email"]).first() if options["email"] else users.first()
+        if user is None:
+            raise CommandError("No user to log in as.")
+
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        paths = options["paths"]
+        total = options["requests"]
+        for concurrency in options["concurrency"]:
+            for name, run in (("wsgi", self._run_wsgi), ("asgi", self._run_asgi)):
+                started = time.perf_counter()
+                latencies = run(paths, cookie, total, concurrency)
+                elapsed = time.perf_counter() - started
+                latencies.sort()
+                self.stdout.write(
+                    f"{name} c={concurrency:<4} {total / elapsed:8.1f} req/s"
+                    f"  p50 {statistics.median(latencies) * 1000:7.2f} ms"
+                    f"  p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.2f} ms"
+                )
+
+    @staticmethod
+    def _run_wsgi(paths: list[str], cookie: str, total: int, concurrency: int) -> list[float]:
+        application = get_wsgi_application()
+
+        def request(i: int) -> float:
+            path, _, query = paths[i % len(paths)].partition("?")
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "SERVER_NAME": "localhost",
+                "SERVER_PORT": "80",
+                "HTTP_HOST": "localhost",
+                "HTTP_COOKIE": cookie,
+                "wsgi.url_scheme": "http",
+                "wsgi.input": io.BytesIO(),
+                "wsgi.errors": io.StringIO(),
+            }
+            started = time.perf_counter()
+            response = application(environ, lambda status, headers: None)
+            for _ in response:
+                pass
+            response.close()
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(request, range(total)))
+
+    @staticmethod
+    def _run_asgi(paths: list[str], cookie: str, total: int, concurrency: int) -> list[float]:
+        application = get_asgi_application()
+
+        async def request(i: int, semaphore: asyncio.Semaphore) -> float:
+            path, _, query = paths[i % len(paths)].partition("?")
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "root_path": "",
+                "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode())],
+                "client": ("127.0.0.1", 0),
+                "server": ("localhost", 80),
+            }
+            disconnected = asyncio.Event()
+            sent_body = False
+
+            async def receive():
+                nonlocal sent_body
+                if not sent_body:
+                    sent_body = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.body" and not message.get("more_body"):
+                    disconnected.set()
+
+            async with semaphore:
+                started = time.perf_counter()
+                await application(scope, receive, send)
+                return time.perf_counter() - started
+
+        async def run() -> list[float]:
+            semaphore = asyncio.Semaphore(concurrency)
+            return list(await asyncio.gather(*(request(i, semaphore) for i in range(total))))
+
+        return asyncio.run(run())
@@ -0,0 +1,133 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+# "SCAN <table>" without an index means a read grows with the table rather than with the result.
+_SCAN_RE = re.compile(r"^SCAN (\w+)$")
+_TEMP_SORT = "USE TEMP B-TREE"
+_SKIPPED = ("INSERT", "BEGIN", "SAVEPOINT", "RELEASE", "ROLLBACK", "COMMIT")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN QUERY PLAN on every query ForumService issues against a seeded throwaway database, "
+        "exits non-zero when one scans a whole table or sorts in a temp B-tree."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=30)
+        parser.add_argument("--replies", type=int, default=20, help="Replies per thread.")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print the plan of every query.")
+
+    def handle(self, *args, **options):
+        from core.services import search, writer
+
+        # Seeding goes straight to the throwaway database, search through the FTS tables in it.
+        old_queue, old_engine = writer.write_queue, search._engine
+        writer.write_queue = None
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            search._engine = search.SqliteFtsSearch()
+            with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+                seed(options["threads"], options["replies"])
+                failures = self._check(capture_queries(), options["verbose_plans"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            writer.write_queue, search._engine = old_queue, old_engine
+
+        if failures:
+            raise CommandError(f"{failures} queries without a usable index, see above.")
+        self.stdout.write(self.style.SUCCESS("All query plans use indexes."))
+
+    def _check(self, queries: list[tuple[str, str]], verbose: bool) -> int:
+        failures = 0
+        for label, sql, plan, bad in explain(queries):
+            if bad or verbose:
+                style = self.style.ERROR if bad else self.style.SQL_KEYWORD
+                self.stdout.write(style(f"{label}: {sql}"))
+                for line in plan:
+                    self.stdout.write(f"    {line}")
+            failures += bool(bad)
+        return failures
+
+
+def seed(threads: int, replies: int) -> None:
+    from core.models import CustomUser
+    from core.services.forum import ForumService
+
+    user = CustomUser.objects.create_user(email="plans@example.com", password=None)
+    for i in range(threads):
+        thread = ForumService.create_thread(
+            title=f"Thread {i}", content=f"Opening post {i}", tags=[f"tag{i % 5}", "common"], user_id=user.id
+        )
+        for j in range(replies):
+            ForumService.add_reply(thread_pub_id=str(thread.public_id), content=f"Reply {j}", user_id=user.id)
+
+
+def capture_queries() -> list[tuple[str, str]]:
+    """(label, sql) of every query run by the ForumService calls views make."""
+    from core.models import Reply, Thread
+    from core.services.forum import ForumService
+    from core.services.tags import get_tag_cloud
+
+    thread = Thread.objects.order_by("id").first()
+    thread_pub_id = str(thread.public_id)
+    reply = Reply.objects.filter(thread=thread).order_by("-id").first()
+    reply_pub_id = str(reply.public_id)
+    user_id = thread.created_by_id
+
+    calls = {
+        "thread_exists": lambda: ForumService.thread_exists(thread_pub_id),
+        "reply_exists": lambda: ForumService.reply_exists(reply_pub_id),
+        "can_update_delete_reply": lambda: ForumService.can_update_delete_reply(user_id, reply_pub_id),
+        "get_thread": lambda: ForumService.get_thread(thread_pub_id),
+        "get_threads": lambda: ForumService.get_threads(limit=5, cursor=ForumService.get_threads(limit=5).next_cursor),
+        "get_threads new": lambda: ForumService.get_threads(
+            limit=5, cursor=ForumService.get_threads(limit=5, order="new").next_cursor, order="new"
+        ),
+        "get_replies": lambda: ForumService.get_replies(
+            thread_pub_id, limit=5, cursor=ForumService.get_replies(thread_pub_id, limit=5).next_cursor
+        ),
+        "iter_replies": lambda: list(ForumService.iter_replies(thread_pub_id, chunk_size=5)),
+        "search_threads": lambda: ForumService.search_threads("reply"),
+        "search_threads_by_tags": lambda: ForumService.search_threads_by_tags(["tag1", "common"]),
+        "get_tag_cloud": lambda: get_tag_cloud(),
+        "add_reply": lambda: ForumService.add_reply(thread_pub_id, "Plan check", user_id),
+        "update_reply": lambda: ForumService.update_reply(reply_pub_id, "Plan check, edited", user_id),
+        "delete_reply": lambda: ForumService.delete_reply(reply_pub_id, user_id),
+        "delete_thread": lambda: ForumService.delete_thread(thread_pub_id),
+        "purge_deleted_thread": lambda: ForumService.purge_deleted_thread(thread.id, batch_size=5),
+    }
+
+    queries = []
+    for label, call in calls.items():
+        with CaptureQueriesContext(connection) as captured:
+            call()
+        queries.extend((label, query["sql"]) for query in captured.captured_queries)
+    return queries
+
+
+def explain(queries: list[tuple[str, str]]) -> list[tuple[str, str, list[str], list[str]]]:
+    """(label, sql, plan, plan lines without a usable index) per query."""
+    results = []
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        for label, sql in queries:
+            if sql.lstrip().upper().startswith(_SKIPPED):
+                continue
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[3] for row in cursor.fetchall()]
+            bad = [line for line in plan if _is_full_scan(line, tables)]
+            # Ranking full text matches has to sort them, the matches come from the FTS index.
+            if not any("VIRTUAL TABLE" in line for line in plan):
+                bad += [line for line in plan if _TEMP_SORT in line]
+            results.append((label, sql, plan, bad))
+    return results
+
+
+def _is_full_scan(line: str, tables: set[str]) -> bool:
+    # Scans of CTEs and subqueries read rows an earlier step produced, not a table.
+    match = _SCAN_RE.match(line)
+    return match is not None and match.group(1) in tables
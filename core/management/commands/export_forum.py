@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from core.services.transfer import ExportEncoder, export_forum
+
+
+class Command(BaseCommand):
+    help = "Stream users, tags, threads and replies as JSONL, for import_forum."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="-", help="File to write, - for stdout.")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["output"] == "-":
+            self._export(sys.stdout, options["chunk_size"])
+        else:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                written = self._export(f, options["chunk_size"])
+            self.stderr.write(self.style.SUCCESS(f"Exported {written} records to {options['output']}."))
+
+    @staticmethod
+    def _export(f, chunk_size: int) -> int:
+        encoder = ExportEncoder(ensure_ascii=False)
+        written = 0
+        for record in export_forum(chunk_size=chunk_size):
+            f.write(encoder.encode(record))
+            f.write("\n")
+            written += 1
+        return written
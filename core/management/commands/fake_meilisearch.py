@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.services.meilisearch_fake import make_server
+
+
+class Command(BaseCommand):
+    help = "Run an in-memory fake Meilisearch server for offline development."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=7700)
+
+    def handle(self, *args, **options):
+        server = make_server(host=options["host"], port=options["port"])
+        self.stdout.write(f"Fake Meilisearch listening on http://{options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,62 @@
+import io
+import json
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.cache import bump_index_version
+from core.services.forum import ForumService
+from core.services.search import get_search_engine
+from core.services.tags import repair_tag_counts
+from core.services.transfer import ForumImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import JSONL written by export_forum. Rows are inserted in batches, rendering, "
+        "counters and the search index are done once at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL file, - for stdin.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Records per transaction.")
+
+    def handle(self, *args, **options):
+        importer = ForumImporter(batch_size=options["batch_size"])
+        if options["path"] == "-":
+            self._feed(importer, sys.stdin)
+        else:
+            with open(options["path"], encoding="utf-8") as f:
+                self._feed(importer, f)
+
+        total = sum(importer.imported.values())
+        for kind, imported in importer.imported.items():
+            self.stdout.write(f"{kind:<7} {imported:>9} imported {importer.skipped[kind]:>7} skipped")
+        rate = total / max(importer.elapsed, 1e-9)
+        self.stdout.write(f"Inserted {total} rows in {importer.elapsed:.1f}s, {rate:.0f} rows/s.")
+
+        started = time.perf_counter()
+        call_command("rerender_replies", stdout=io.StringIO())
+        ForumService.repair_thread_counters()
+        repair_tag_counts()
+        get_search_engine().rebuild()
+        bump_index_version()
+        self.stdout.write(self.style.SUCCESS(f"Rendered, counted and indexed in {time.perf_counter() - started:.1f}s."))
+
+    @staticmethod
+    def _feed(importer: ForumImporter, lines) -> None:
+        def records():
+            for number, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise CommandError(f"Line {number}: {e}") from e
+
+        try:
+            importer.feed(records())
+        except (ValueError, KeyError) as e:
+            raise CommandError(str(e)) from e
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+
+def _post_replies(thread_pub_id: str, user_id: int, posters: int, replies: int, direct: bool) -> tuple[list, list]:
+    """Post replies from posters threads at once, returns latencies and error messages."""
+    from core.services import writer
+    from core.services.forum import ForumService
+
+    if direct:
+        writer.write_queue = None
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(posters)
+
+    def poster(number: int) -> None:
+        start.wait()
+        for i in range(replies):
+            started = time.perf_counter()
+            try:
+                ForumService.add_reply(thread_pub_id=thread_pub_id, content=f"Load test {number}.{i}", user_id=user_id)
+            except OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+        connections.close_all()
+
+    threads = [threading.Thread(target=poster, args=(n,)) for n in range(posters)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def _process_main(args: tuple) -> tuple[list, list]:
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "forumukas.settings")
+    django.setup()
+    return _post_replies(*args)
+
+
+class Command(BaseCommand):
+    help = "Post replies from many concurrent threads (and processes) and report write latency and lock errors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posters", type=int, default=200, help="Concurrent posting threads per process.")
+        parser.add_argument("--replies", type=int, default=5, help="Replies per poster.")
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument("--direct", action="store_true", help="Bypass the write queue, for comparison.")
+
+    def handle(self, *args, **options):
+        # Imported here as spawned workers import this module before django.setup().
+        from core.models import CustomUser
+        from core.services.forum import ForumService
+
+        user, _ = CustomUser.objects.get_or_create(email="loadtest@example.com", defaults={"username": "loadtest"})
+        thread = ForumService.create_thread(
+            title=f"Load test {time.time_ns()}",
+            content="Replies below are written by `manage.py loadtest_writes`.",
+            tags=[],
+            user_id=user.id,
+        )
+        job = (str(thread.public_id), user.id, options["posters"], options["replies"], options["direct"])
+
+        started = time.perf_counter()
+        if options["processes"] == 1:
+            results = [_post_replies(*job)]
+        else:
+            connections.close_all()
+            with multiprocessing.get_context("spawn").Pool(options["processes"]) as pool:
+                results = pool.map(_process_main, [job] * options["processes"])
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for result in results for latency in result[0])
+        errors = [error for result in results for error in result[1]]
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+        self.stdout.write(
+            f"{len(latencies)} replies in {elapsed:.2f}s, {len(latencies) / elapsed:.0f} writes/s, {len(errors)} errors"
+        )
+        self.stdout.write(
+            f"latency p50 {percentile(0.5):.1f} ms  p95 {percentile(0.95):.1f} ms"
+            f"  p99 {percentile(0.99):.1f} ms  max {percentile(1.0):.1f} ms"
+        )
+        for error in sorted(set(errors))[:5]:
+            self.stdout.write(self.style.ERROR(f"{errors.count(error)}x {error}"))
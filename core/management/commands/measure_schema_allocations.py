@@ -0,0 +1,60 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Reply, Thread
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare memory allocated building ReplySchemas from model instances (as_schema) "
+        "and from values() rows (schema_from_row), normalized per 1000 replies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--replies", type=int, default=1000)
+        parser.add_argument("--rounds", type=int, default=5)
+
+    def handle(self, *args, **options):
+        thread = Thread.objects.order_by("-reply_count").first()
+        if thread is None:
+            raise CommandError("No threads to measure.")
+
+        limit = options["replies"]
+        replies = Reply.objects.filter(thread_id=thread.id).order_by("created_at", "id")[:limit]
+
+        def instances():
+            return [r.as_schema() for r in replies.select_related("created_by")]
+
+        def rows():
+            return [Reply.schema_from_row(row) for row in Reply.schema_values(replies)]
+
+        count = len(rows())
+        if not count:
+            raise CommandError("Thread has no replies.")
+
+        for name, build in (("as_schema", instances), ("schema_from_row", rows)):
+            build()  # Warm up query compilation and caches.
+            allocated, blocks, elapsed = [], [], []
+            for _ in range(options["rounds"]):
+                tracemalloc.start()
+                started = time.perf_counter()
+                result = build()
+                elapsed.append(time.perf_counter() - started)
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                stats = snapshot.statistics("filename")
+                allocated.append(peak)
+                blocks.append(sum(stat.count for stat in stats))
+                del result
+
+            scale = 1000 / count
+            self.stdout.write(
+                f"{name:<16} peak {min(allocated) * scale / 1024:8.1f} KiB"
+                f"  live blocks {min(blocks) * scale:8.0f}"
+                f"  time {min(elapsed) * scale * 1000:6.2f} ms  per 1000 replies"
+            )
+
+        self.stdout.write(f"Measured {count} replies of thread {thread.public_id}.")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Reply, Thread
+from core.services.forum import ForumService
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete soft deleted threads and their replies in small transactions, pausing in between so other "
+        "writers get the SQLite write lock. Safe to interrupt, a rerun continues where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Replies deleted per transaction.")
+        parser.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        pending = Thread.all_objects.filter(deleted_at__isnull=False).order_by("deleted_at")
+        purged = 0
+        for thread_id, title in pending.values_list("id", "title"):
+            total = Reply.objects.filter(thread_id=thread_id).count()
+            done = 0
+            started = time.perf_counter()
+            while deleted := ForumService.purge_deleted_thread(thread_id=thread_id, batch_size=options["batch_size"]):
+                done += deleted
+                self.stdout.write(f"Thread {thread_id}: {done}/{total} replies deleted")
+                time.sleep(options["pause"])
+            purged += 1
+            self.stdout.write(f"Purged thread {thread_id} {title!r} in {time.perf_counter() - started:.1f}s.")
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} threads."))
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.services.search import get_search_engine
+
+
+class Command(BaseCommand):
+    help = "Reindex all threads and replies into the configured search engine."
+
+    def handle(self, *args, **options):
+        engine = get_search_engine()
+        engine.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {settings.SEARCH_ENGINE} search index."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.services.forum import ForumService
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized reply counters, last reply time and excerpts of all threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = ForumService.repair_thread_counters(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Repaired counters of {updated} threads."))
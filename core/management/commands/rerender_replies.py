@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Reply
+from core.services.cache import bump_thread_version
+from core.services.render import RENDERER_VERSION, render_many
+
+
+class Command(BaseCommand):
+    help = "Re-render stored reply html, run after changing markdown extras or sanitizer config."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Re-render every reply, not only stale ones.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        q = Reply.objects.order_by("id")
+        if not options["all"]:
+            q = q.exclude(content_html_version=RENDERER_VERSION)
+
+        batch_size = options["batch_size"]
+        last_id = 0
+        done = 0
+        fallbacks = 0
+
+        while True:
+            # Keyset over ids keeps memory bounded to one batch.
+            rows = list(q.filter(id__gt=last_id).values_list("id", "content", "thread__public_id")[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            # render_many spreads the batch over the shared render pool.
+            rendered = render_many([content for _, content, _ in rows])
+            replies = [
+                Reply(id=reply_id, content_html=html, content_html_version=version)
+                for (reply_id, _, _), (html, version) in zip(rows, rendered)
+            ]
+            with transaction.atomic():
+                Reply.objects.bulk_update(replies, ["content_html", "content_html_version"])
+                # Cached thread pages and reply lists hold the old html.
+                for thread_pub_id in {str(thread_pub_id) for _, _, thread_pub_id in rows}:
+                    bump_thread_version(thread_pub_id)
+            done += len(replies)
+            fallbacks += sum(reply.content_html_version != RENDERER_VERSION for reply in replies)
+
+            self.stdout.write(f"Rendered {done} replies.")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Done, {done} replies rendered, {fallbacks} as plain text to retry on the next run.")
+        )
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services.meilisearch import MeilisearchClient, MeilisearchError, OutboxDrainer
+
+
+class Command(BaseCommand):
+    help = "Drain the search outbox into Meilisearch in coalesced batches, run a single instance."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--max-backoff", type=float, default=60.0)
+        parser.add_argument("--once", action="store_true", help="Drain until empty and exit.")
+
+    def handle(self, *args, **options):
+        client = MeilisearchClient()
+        drainer = OutboxDrainer(client=client, batch_size=options["batch_size"])
+        failures = 0
+        configured = False
+
+        while True:
+            try:
+                if not configured:
+                    client.configure_index()
+                    configured = True
+                handled = drainer.drain_batch()
+            except MeilisearchError as e:
+                failures += 1
+                backoff = min(2 ** failures, options["max_backoff"])
+                self.stderr.write(f"{e}, retrying in {backoff:.0f}s.")
+                time.sleep(backoff)
+                continue
+
+            failures = 0
+            if handled:
+                self.stdout.write(f"Pushed {handled} outbox entries.")
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
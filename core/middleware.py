@@ -0,0 +1,120 @@
+import json
+import logging
+import random
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject
+
+from core.routers import reset_read_only, set_read_only
+from core.services import metrics, users
+from core.services.timing import end_request, start_request
+
+_logger = logging.getLogger("forumukas.timing")
+
+
+@sync_and_async_middleware
+def timing_middleware(get_response):
+    """Server-Timing header on responses plus a log record of slow and sampled requests, feeds metrics too.
+
+    Put first in MIDDLEWARE so the other middleware is timed too.
+    """
+    header = settings.FORUM_TIMING_HEADER
+    slow = settings.FORUM_TIMING_SLOW_MS / 1000 if settings.FORUM_TIMING_SLOW_MS is not None else None
+    sample_rate = settings.FORUM_TIMING_SAMPLE_RATE
+    if not header and slow is None and not sample_rate and not settings.FORUM_METRICS_ENABLED:
+        raise MiddlewareNotUsed
+
+    def finish(request, response, timer, sampled: bool):
+        view = request.resolver_match.view_name if request.resolver_match else "unmatched"
+        metrics.observe_request(view, response.status_code, timer)
+
+        if header:
+            response["Server-Timing"] = timer.server_timing()
+
+        is_slow = slow is not None and timer.elapsed > slow
+        if is_slow or sampled:
+            record = {
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "slow": is_slow,
+                "sampled": sampled,
+                **timer.as_record(),
+            }
+            _logger.log(logging.WARNING if is_slow else logging.INFO, json.dumps(record))
+        return response
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            sampled = sample_rate > 0 and random.random() < sample_rate
+            timer, token = start_request(call_sites=sampled)
+            try:
+                response = await get_response(request)
+            finally:
+                end_request(token)
+            return finish(request, response, timer, sampled)
+
+    else:
+
+        def middleware(request):
+            sampled = sample_rate > 0 and random.random() < sample_rate
+            timer, token = start_request(call_sites=sampled)
+            try:
+                response = get_response(request)
+            finally:
+                end_request(token)
+            return finish(request, response, timer, sampled)
+
+    return middleware
+
+
+@sync_and_async_middleware
+def read_replica_middleware(get_response):
+    """Route ORM reads of GET and HEAD requests to the read-only database alias."""
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = set_read_only(request.method in ("GET", "HEAD"))
+            try:
+                return await get_response(request)
+            finally:
+                reset_read_only(token)
+
+    else:
+
+        def middleware(request):
+            token = set_read_only(request.method in ("GET", "HEAD"))
+            try:
+                return get_response(request)
+            finally:
+                reset_read_only(token)
+
+    return middleware
+
+
+def _get_user(request):
+    if not hasattr(request, "_cached_user"):
+        request._cached_user = users.get_user(request)
+    return request._cached_user
+
+
+async def _auser(request):
+    if not hasattr(request, "_acached_user"):
+        request._acached_user = await users.aget_user(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware resolving request.user and request.auser() through the user cache."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_user(request))
+        request.auser = partial(_auser, request)
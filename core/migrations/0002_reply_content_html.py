@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reply',
+            name='content_html',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Sanitized html rendered from content on write.'),
+        ),
+        migrations.AddField(
+            model_name='reply',
+            name='content_html_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    # Excerpts need rendered html, run `manage.py repair_thread_counters` after rerender_replies.
+    Thread = apps.get_model("core", "Thread")
+    Reply = apps.get_model("core", "Reply")
+    replies = Reply.objects.filter(thread_id=OuterRef("id")).order_by().values("thread_id")
+    Thread.objects.update(
+        reply_count=Coalesce(Subquery(replies.annotate(c=Count("id")).values("c")), 1) - 1,
+        last_reply_at=Coalesce(Subquery(replies.annotate(m=Max("created_at")).values("m")), F("created_at")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_reply_content_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='last_reply_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, help_text='Replies excluding the opening post.'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+# Rowids interleave both sources: reply id * 2 for replies, thread id * 2 + 1 for titles.
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE core_search_fts USING fts5(
+        body,
+        thread_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER core_reply_fts_insert AFTER INSERT ON core_reply BEGIN
+        INSERT INTO core_search_fts(rowid, body, thread_id) VALUES (new.id * 2, new.content, new.thread_id);
+    END
+    """,
+    """
+    CREATE TRIGGER core_reply_fts_update AFTER UPDATE OF content ON core_reply BEGIN
+        UPDATE core_search_fts SET body = new.content WHERE rowid = new.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER core_reply_fts_delete AFTER DELETE ON core_reply BEGIN
+        DELETE FROM core_search_fts WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER core_thread_fts_insert AFTER INSERT ON core_thread BEGIN
+        INSERT INTO core_search_fts(rowid, body, thread_id) VALUES (new.id * 2 + 1, new.title, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER core_thread_fts_update AFTER UPDATE OF title ON core_thread BEGIN
+        UPDATE core_search_fts SET body = new.title WHERE rowid = new.id * 2 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER core_thread_fts_delete AFTER DELETE ON core_thread BEGIN
+        DELETE FROM core_search_fts WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    "INSERT INTO core_search_fts(rowid, body, thread_id) SELECT id * 2 + 1, title, id FROM core_thread",
+    "INSERT INTO core_search_fts(rowid, body, thread_id) SELECT id * 2, content, thread_id FROM core_reply",
+]
+
+BACKWARD_SQL = [
+    "DROP TRIGGER IF EXISTS core_reply_fts_insert",
+    "DROP TRIGGER IF EXISTS core_reply_fts_update",
+    "DROP TRIGGER IF EXISTS core_reply_fts_delete",
+    "DROP TRIGGER IF EXISTS core_thread_fts_insert",
+    "DROP TRIGGER IF EXISTS core_thread_fts_update",
+    "DROP TRIGGER IF EXISTS core_thread_fts_delete",
+    "DROP TABLE IF EXISTS core_search_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 only exists on SQLite, other databases use a different search engine.
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_thread_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARD_SQL), _run(BACKWARD_SQL)),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_search_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('thread', 'Thread'), ('reply', 'Reply'), ('index', 'Whole index')], max_length=10)),
+                ('op', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], max_length=10)),
+                ('object_id', models.BigIntegerField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Search Outbox Entry',
+                'verbose_name_plural': 'Search Outbox',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_thread_counts(apps, schema_editor):
+    Tag = apps.get_model("core", "Tag")
+    ThreadTag = apps.get_model("core", "ThreadTag")
+    counts = ThreadTag.objects.filter(tag_id=OuterRef("id")).order_by().values("tag_id").annotate(c=Count("id"))
+    Tag.objects.update(thread_count=Coalesce(Subquery(counts.values("c")), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_search_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='thread_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddIndex(
+            model_name='threadtag',
+            index=models.Index(fields=['tag', 'thread'], name='core_threadtag_tag_thread_idx'),
+        ),
+        migrations.RunPython(fill_thread_counts, migrations.RunPython.noop),
+    ]
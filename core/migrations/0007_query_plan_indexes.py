@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:27
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+from core.migrations._search_triggers import restore_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_tag_thread_count'),
+    ]
+
+    operations = [
+        # Unapplying rebuilds core_reply last, restore the triggers after it.
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        migrations.AlterField(
+            model_name='reply',
+            name='public_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Public facing ID, please do not leak id field to the public.', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='reply',
+            name='thread',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='core.thread'),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='public_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Public facing ID, please do not leak id field to the public.', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='thread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='thread',
+            name='public_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Public facing ID, please do not leak id field to the public.', unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='reply',
+            index=models.Index(fields=['thread', 'created_at', 'id'], name='core_reply_thread_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-thread_count', 'name'], name='core_tag_cloud_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['last_reply_at', 'id'], name='core_thread_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['created_at', 'id'], name='core_thread_created_idx'),
+        ),
+        # Altering reply.thread rebuilt core_reply without the FTS triggers.
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:29
+
+import uuid
+
+import core.services.public_ids
+from django.db import migrations
+
+from core.migrations._search_triggers import restore_triggers
+
+TABLES = ("core_thread", "core_reply", "core_tag")
+
+
+def text_to_bytes(apps, schema_editor):
+    # The table rebuild copies the 32 character hex values as they are.
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f"SELECT id, public_id FROM {table} WHERE typeof(public_id) = 'text'")
+            rows = [(uuid.UUID(public_id).bytes, pk) for pk, public_id in cursor.fetchall()]
+            cursor.executemany(f"UPDATE {table} SET public_id = %s WHERE id = %s", rows)
+
+
+def bytes_to_text(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f"SELECT id, public_id FROM {table} WHERE typeof(public_id) = 'blob'")
+            rows = [(uuid.UUID(bytes=bytes(public_id)).hex, pk) for pk, public_id in cursor.fetchall()]
+            cursor.executemany(f"UPDATE {table} SET public_id = %s WHERE id = %s", rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        migrations.AlterField(
+            model_name='reply',
+            name='public_id',
+            field=core.services.public_ids.PublicIdField(default=core.services.public_ids.new_uuid, editable=False, help_text='Public facing ID, please do not leak id field to the public.', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='public_id',
+            field=core.services.public_ids.PublicIdField(default=core.services.public_ids.new_uuid, editable=False, help_text='Public facing ID, please do not leak id field to the public.', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='thread',
+            name='public_id',
+            field=core.services.public_ids.PublicIdField(default=core.services.public_ids.new_uuid, editable=False, help_text='Public facing ID, please do not leak id field to the public.', unique=True),
+        ),
+        migrations.RunPython(text_to_bytes, bytes_to_text),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_compact_public_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='Hidden since, rows are deleted in batches by manage.py purge_deleted_threads.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='core_thread_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+"""FTS triggers of migration 0004, for migrations that rebuild core_reply or core_thread.
+
+SQLite alters most columns by copying the table to a new one and dropping the old, which drops
+its triggers too. Module names starting with an underscore are not loaded as migrations.
+"""
+
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_reply_fts_insert AFTER INSERT ON core_reply BEGIN
+        INSERT INTO core_search_fts(rowid, body, thread_id) VALUES (new.id * 2, new.content, new.thread_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_reply_fts_update AFTER UPDATE OF content ON core_reply BEGIN
+        UPDATE core_search_fts SET body = new.content WHERE rowid = new.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_reply_fts_delete AFTER DELETE ON core_reply BEGIN
+        DELETE FROM core_search_fts WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_thread_fts_insert AFTER INSERT ON core_thread BEGIN
+        INSERT INTO core_search_fts(rowid, body, thread_id) VALUES (new.id * 2 + 1, new.title, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_thread_fts_update AFTER UPDATE OF title ON core_thread BEGIN
+        UPDATE core_search_fts SET body = new.title WHERE rowid = new.id * 2 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_thread_fts_delete AFTER DELETE ON core_thread BEGIN
+        DELETE FROM core_search_fts WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+
+def restore_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in TRIGGERS_SQL:
+        schema_editor.execute(sql)
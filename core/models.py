@@ -1,8 +1,6 @@
 import datetime
 import logging
-import uuid
 
-import markdown2
 import nh3
 import pydantic
 from django.conf import settings
@@ -10,8 +8,13 @@ from django.contrib import admin
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
 
-from core.utils import url_to_instance
+from core.services import public_ids
+from core.services.render import is_stored_html_current, render_for_storage, render_markdown
+from core.utils import EstimatedCountPaginator, url_to_instance
 
 _logger = logging.getLogger("forumukas")
 
@@ -74,11 +77,11 @@ class CustomUserAdmin(admin.ModelAdmin):
 class BaseDbModel(models.Model):
     """Base model for all models in the project."""
 
-    public_id = models.UUIDField(
-        default=uuid.uuid4,
+    public_id = public_ids.PublicIdField(
+        default=public_ids.new_uuid,
         editable=False,
         help_text="Public facing ID, please do not leak id field to the public.",
-        db_index=True,
+        unique=True,  # Lets SQLite know a lookup yields one row, so joined reads keep index order.
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -88,6 +91,11 @@ class BaseDbModel(models.Model):
         abstract = True
         ordering = ("-created_at",)
 
+    @property
+    def pub_id(self) -> str:
+        """public_id as used in URLs."""
+        return public_ids.encode(self.public_id)
+
     def save(self, *args, **kwargs):
         # All models inheriting BaseModel will have their updated_by automatically set.
         self.modified_at = datetime.datetime.now(tz=datetime.timezone.utc)
@@ -107,15 +115,25 @@ class BaseDbModelWithUser(BaseDbModel):
 
 
 class Tag(BaseDbModel):
-    name = models.CharField(max_length=25, unique=True)
+    MAX_LENGTH = 25
+
+    name = models.CharField(max_length=MAX_LENGTH, unique=True)
+    # Maintained by ForumService, modified_at is bumped with it so per tag caches can key on it.
+    thread_count = models.PositiveIntegerField(default=0)
 
     def __str__(self) -> str:
         return self.name
 
+    class Meta(BaseDbModel.Meta):
+        indexes = [
+            # Tag cloud order, thread_count > 0 is a range on its first column.
+            models.Index(fields=["-thread_count", "name"], name="core_tag_cloud_idx"),
+        ]
+
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ("name",)
+    list_display = ("name", "thread_count")
 
 
 class ThreadSchema(pydantic.BaseModel):
@@ -128,33 +146,67 @@ class ThreadSchema(pydantic.BaseModel):
     replies_count: int
 
 
+class VisibleThreadManager(models.Manager):
+    """Threads that are not soft deleted, Thread.all_objects includes those."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Thread(BaseDbModelWithUser):
+    EXCERPT_LENGTH = 200
+
     title = models.CharField(max_length=100, unique=True)
 
+    # Denormalized by ForumService so listings need no per thread queries.
+    reply_count = models.PositiveIntegerField(default=0, help_text="Replies excluding the opening post.")
+    last_reply_at = models.DateTimeField(default=timezone.now)
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, default="")
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Hidden since, rows are deleted in batches by manage.py purge_deleted_threads.",
+    )
+
+    objects = VisibleThreadManager()
+    all_objects = models.Manager()
+
     def __str__(self) -> str:
         return str(self.id)
 
     class Meta:
         verbose_name = "Thread"
         verbose_name_plural = "Threads"
+        indexes = [
+            # Keyset pagination of THREAD_ORDERINGS, id breaks ties.
+            models.Index(fields=["last_reply_at", "id"], name="core_thread_activity_idx"),
+            models.Index(fields=["created_at", "id"], name="core_thread_created_idx"),
+            # Only soft deleted threads, for the purge.
+            models.Index(
+                fields=["deleted_at"], name="core_thread_deleted_idx", condition=models.Q(deleted_at__isnull=False)
+            ),
+        ]
+
+    @classmethod
+    def make_excerpt(cls, content_html: str) -> str:
+        return Truncator(strip_tags(content_html).strip()).chars(cls.EXCERPT_LENGTH)
 
     def get_content(self) -> str:
         # First reply is the "content" of the thread.
-        return self.replies.first().get_content_as_html()
+        return self.replies.order_by("created_at", "id").first().get_content_as_html()
 
     def count_replies(self) -> int:
-        amount_replies = self.replies.count()
-        return amount_replies - 1  if amount_replies > 0 else 0
+        return self.reply_count
 
     def as_schema(self) -> ThreadSchema:
         return ThreadSchema(
-            pub_id=str(self.public_id),
+            pub_id=self.pub_id,
             title=self.get_clean_title(),
             content=self.get_content(),
             created_by=self.created_by.username,
             created_at=self.created_at,
             modified_at=self.modified_at,
-            replies_count=self.replies.count() - 1,  # Exclude self.
+            replies_count=self.reply_count,
         )
 
     def as_dict(self) -> dict:
@@ -163,6 +215,40 @@ class Thread(BaseDbModelWithUser):
     def get_clean_title(self) -> str:
         return nh3.clean(self.title)
 
+    @classmethod
+    def schema_values(cls, queryset: models.QuerySet) -> models.QuerySet:
+        """Everything ThreadSchema needs in one query, opening post and author joined in."""
+        opening_post = Reply.objects.filter(thread_id=models.OuterRef("id")).order_by("created_at", "id")
+        return queryset.values(
+            "id",
+            "public_id",
+            "title",
+            "created_at",
+            "modified_at",
+            "reply_count",
+            created_by_username=models.F("created_by__username"),
+            opening_content=models.Subquery(opening_post.values("content")[:1]),
+            opening_content_html=models.Subquery(opening_post.values("content_html")[:1]),
+            opening_content_html_version=models.Subquery(opening_post.values("content_html_version")[:1]),
+        )
+
+    @staticmethod
+    def schema_from_row(row: dict, content: str | None = None) -> ThreadSchema:
+        """ThreadSchema from a schema_values() row, skips validation as the database already typed it."""
+        if content is None:
+            content = Reply.row_content_html(
+                row["opening_content"], row["opening_content_html"], row["opening_content_html_version"]
+            )
+        return ThreadSchema.model_construct(
+            pub_id=public_ids.encode(row["public_id"]),
+            title=nh3.clean(row["title"]),
+            content=content,
+            created_by=row["created_by_username"],
+            created_at=row["created_at"],
+            modified_at=row["modified_at"],
+            replies_count=row["reply_count"],
+        )
+
 
 @admin.register(Thread)
 class ThreadAdmin(admin.ModelAdmin):
@@ -172,7 +258,15 @@ class ThreadAdmin(admin.ModelAdmin):
         url_to_instance("created_by"),
         "created_at",
         "modified_at",
+        "deleted_at",
     )
+    list_select_related = ("created_by",)
+    raw_id_fields = ("created_by",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return Thread.all_objects.all()
 
 
 class ThreadTag(models.Model):
@@ -181,6 +275,9 @@ class ThreadTag(models.Model):
 
     class Meta:
         unique_together = ("thread", "tag")
+        indexes = [
+            models.Index(fields=["tag", "thread"], name="core_threadtag_tag_thread_idx"),
+        ]
         verbose_name = "Thread Tag"
         verbose_name_plural = "Thread Tags"
 
@@ -191,6 +288,10 @@ class ThreadTagAdmin(admin.ModelAdmin):
         url_to_instance("thread"),
         url_to_instance("tag"),
     )
+    list_select_related = ("tag",)  # Thread links show the id, which needs no join.
+    raw_id_fields = ("thread", "tag")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class ReplySchema(pydantic.BaseModel):
@@ -203,11 +304,30 @@ class ReplySchema(pydantic.BaseModel):
 
 
 class Reply(BaseDbModelWithUser):
-    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name="replies")
+    # Indexed by core_reply_thread_created_idx, which starts with thread_id.
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name="replies", db_index=False)
     content = models.TextField()
+    content_html = models.TextField(
+        blank=True,
+        default="",
+        editable=False,
+        help_text="Sanitized html rendered from content on write.",
+    )
+    content_html_version = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    # Content the current content_html was rendered from, save() renders only when it differs.
+    _rendered_content: str | None = None
+
+    def render_content(self, rendered: tuple[str, int] | None = None) -> None:
+        """Set content_html from content, or from the render_for_storage result of a caller who rendered it already."""
+        self.content_html, self.content_html_version = rendered or render_for_storage(self.content)
+        self._rendered_content = self.content
 
     def get_content_as_html(self) -> str:
-        return markdown2.markdown(self.content)
+        if is_stored_html_current(self.content_html_version):
+            return self.content_html
+        # Not backfilled yet, render on the fly without persisting.
+        return render_markdown(self.content)
 
     def __str__(self) -> str:
         return str(self.id)
@@ -215,10 +335,24 @@ class Reply(BaseDbModelWithUser):
     class Meta:
         verbose_name = "Reply"
         verbose_name_plural = "Replies"
+        indexes = [
+            # Replies of a thread in order, first and latest reply lookups included.
+            models.Index(fields=["thread", "created_at", "id"], name="core_reply_thread_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Render once on write so reads never run markdown.
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            if self._rendered_content != self.content:
+                self.render_content()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "content_html", "content_html_version"}
+        super().save(*args, **kwargs)
 
     def as_schema(self) -> ReplySchema:
         return ReplySchema(
-            pub_id=str(self.public_id),
+            pub_id=self.pub_id,
             content=self.get_content_as_html(),
             created_by=self.created_by.username,
             created_by_id=self.created_by.pk,
@@ -229,6 +363,41 @@ class Reply(BaseDbModelWithUser):
     def as_dict(self) -> dict:
         return self.as_schema().model_dump()
 
+    @staticmethod
+    def row_content_html(content: str, content_html: str, content_html_version: int) -> str:
+        if is_stored_html_current(content_html_version):
+            return content_html
+        return render_markdown(content)
+
+    @classmethod
+    def schema_values(cls, queryset: models.QuerySet) -> models.QuerySet:
+        """Everything ReplySchema needs as plain rows, author joined in."""
+        return queryset.values(
+            "id",
+            "public_id",
+            "content",
+            "content_html",
+            "content_html_version",
+            "created_by_id",
+            "created_at",
+            "modified_at",
+            created_by_username=models.F("created_by__username"),
+        )
+
+    @classmethod
+    def schema_from_row(cls, row: dict, content: str | None = None) -> ReplySchema:
+        """ReplySchema from a schema_values() row, skips validation as the database already typed it."""
+        if content is None:
+            content = cls.row_content_html(row["content"], row["content_html"], row["content_html_version"])
+        return ReplySchema.model_construct(
+            pub_id=public_ids.encode(row["public_id"]),
+            content=content,
+            created_by=row["created_by_username"],
+            created_by_id=row["created_by_id"],
+            created_at=row["created_at"],
+            modified_at=row["modified_at"],
+        )
+
 
 @admin.register(Reply)
 class ReplyAdmin(admin.ModelAdmin):
@@ -239,4 +408,49 @@ class ReplyAdmin(admin.ModelAdmin):
         "created_at",
         "modified_at",
     )
+    list_select_related = ("created_by",)  # Thread links show the id, which needs no join.
+    raw_id_fields = ("thread", "created_by")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+
+class SearchOutbox(models.Model):
+    """Pending search index changes, written in the same transaction as the change itself.
+
+    Drained in batches by `manage.py search_outbox_worker`, so posting never waits on the search engine.
+    """
+
+    KIND_THREAD = "thread"
+    KIND_REPLY = "reply"
+    KIND_INDEX = "index"
+    KIND_CHOICES = (
+        (KIND_THREAD, "Thread"),
+        (KIND_REPLY, "Reply"),
+        (KIND_INDEX, "Whole index"),
+    )
+
+    OP_UPSERT = "upsert"
+    OP_DELETE = "delete"
+    OP_CHOICES = (
+        (OP_UPSERT, "Upsert"),
+        (OP_DELETE, "Delete"),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    op = models.CharField(max_length=10, choices=OP_CHOICES)
+    object_id = models.BigIntegerField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Search Outbox Entry"
+        verbose_name_plural = "Search Outbox"
+
+    def __str__(self) -> str:
+        return f"{self.op} {self.kind} {self.object_id}"
+
 
+@admin.register(SearchOutbox)
+class SearchOutboxAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "op", "object_id", "attempts", "created_at")
@@ -0,0 +1,38 @@
+import contextvars
+
+from django.db import connections
+
+READ_ALIAS = "replica"
+WRITE_ALIAS = "default"
+
+_read_only_request: contextvars.ContextVar[bool] = contextvars.ContextVar("read_only_request", default=False)
+
+
+def set_read_only(value: bool) -> contextvars.Token:
+    return _read_only_request.set(value)
+
+
+def reset_read_only(token: contextvars.Token) -> None:
+    _read_only_request.reset(token)
+
+
+class ReadReplicaRouter:
+    """Reads of GET requests go to a read-only connection of the same SQLite file.
+
+    In WAL mode readers never wait for the writer, and a read-only connection can never take the
+    write lock by accident. Reads inside a transaction stay on the writer to see its own changes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _read_only_request.get() and not connections[WRITE_ALIAS].in_atomic_block:
+            return READ_ALIAS
+        return WRITE_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return WRITE_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Both aliases are the same database.
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == WRITE_ALIAS
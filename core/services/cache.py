@@ -0,0 +1,116 @@
+import threading
+import time
+from collections.abc import Callable
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+from core.services import metrics, public_ids
+
+_lock = threading.Lock()
+_hits: dict[str, int] = {}
+_misses: dict[str, int] = {}
+
+
+def _thread_version_key(thread_pub_id: str) -> str:
+    # The same thread may be addressed in base62, hex or dashed form.
+    try:
+        thread_pub_id = public_ids.decode(thread_pub_id).hex
+    except ValueError:
+        pass
+    return f"thread-version:{thread_pub_id}"
+
+
+def _get_version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        # Versions are timestamps, so a version lost to eviction is replaced by a newer one
+        # and entries cached under the old version can never be served again.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key, 0)
+    return version
+
+
+def _bump_version(key: str) -> None:
+    cache.set(key, max(time.time_ns(), (cache.get(key) or 0) + 1), timeout=None)
+
+
+def get_thread_version(thread_pub_id: str) -> int:
+    """Current cache version of a thread, part of every cache key derived from the thread.
+
+    Versions are nanosecond timestamps of the last change, views use them as Last-Modified too.
+    """
+    return _get_version(_thread_version_key(thread_pub_id))
+
+
+def get_index_version() -> int:
+    """Current version of thread listings, changes with any thread."""
+    return _get_version("index-version")
+
+
+def bump_thread_version(thread_pub_id: str) -> None:
+    """Invalidate everything cached for a thread and listings once the current transaction commits."""
+    key = _thread_version_key(thread_pub_id)
+
+    def bump():
+        _bump_version(key)
+        _bump_version("index-version")
+
+    transaction.on_commit(bump, robust=True)
+
+
+def bump_index_version() -> None:
+    """Invalidate listings once the current transaction commits."""
+    transaction.on_commit(lambda: _bump_version("index-version"), robust=True)
+
+
+def get_or_compute(namespace: str, key: str, compute: Callable, timeout=DEFAULT_TIMEOUT):
+    """Cached value of compute(), counting hits and misses per namespace."""
+    full_key = f"{namespace}:{key}"
+    value = cache.get(full_key)
+    if value is not None:
+        _count(_hits, namespace)
+        return value
+
+    _count(_misses, namespace)
+    value = compute()
+    cache.set(full_key, value, timeout=timeout)
+    return value
+
+
+async def aget_or_compute(namespace: str, key: str, compute: Callable, timeout=DEFAULT_TIMEOUT):
+    """get_or_compute for an async compute().
+
+    The disk cache is a local file read taking microseconds, so it is called inline rather than
+    through a thread hop like Django's BaseCache.aget does.
+    """
+    full_key = f"{namespace}:{key}"
+    value = cache.get(full_key)
+    if value is not None:
+        _count(_hits, namespace)
+        return value
+
+    _count(_misses, namespace)
+    value = await compute()
+    cache.set(full_key, value, timeout=timeout)
+    return value
+
+
+def _count(counter: dict[str, int], namespace: str) -> None:
+    with _lock:
+        counter[namespace] = counter.get(namespace, 0) + 1
+    metrics.inc("forum_cache_requests_total", {"namespace": namespace, "result": "hit" if counter is _hits else "miss"})
+
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters and hit rate of this process per namespace.
+
+    The disk cache's own statistics stay off, collecting them turns every cache read into a write.
+    """
+    with _lock:
+        counts = {namespace: (_hits.get(namespace, 0), _misses.get(namespace, 0)) for namespace in {*_hits, *_misses}}
+    return {
+        namespace: {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+        for namespace, (hits, misses) in sorted(counts.items())
+    }
@@ -1,5 +1,32 @@
-from core.models import Reply, Thread, ThreadSchema
-from django.core.paginator import Paginator
+from collections.abc import Iterator
+
+from asgiref.sync import sync_to_async
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import Reply, ReplySchema, Thread, ThreadSchema, ThreadTag
+from core.services.cache import (
+    aget_or_compute,
+    bump_index_version,
+    bump_thread_version,
+    get_or_compute,
+    get_thread_version,
+)
+from core.services.pagination import Page, akeyset_paginate, keyset_paginate
+from core.services.public_ids import resolver
+from core.services.render import arender_markdown, is_stored_html_current, render_for_storage
+from core.services.search import get_search_engine
+from core.services.tags import set_thread_tags, tag_index
+from core.services.timing import timed
+from core.services.writer import serialized_write
+
+THREAD_ORDERINGS = {
+    "activity": "last_reply_at",
+    "new": "created_at",
+}
 
 
 class ForumService:
@@ -7,11 +34,19 @@ class ForumService:
 
     @classmethod
     def thread_exists(cls, thread_pub_id: str) -> bool:
-        return Thread.objects.filter(public_id=thread_pub_id).exists()
+        try:
+            resolver.resolve(Thread, thread_pub_id)
+        except Thread.DoesNotExist:
+            return False
+        return True
 
     @classmethod
     def reply_exists(cls, reply_pub_id: str) -> bool:
-        return Reply.objects.filter(public_id=reply_pub_id).exists()
+        try:
+            resolver.resolve(Reply, reply_pub_id)
+        except Reply.DoesNotExist:
+            return False
+        return True
 
     @classmethod
     def can_update_delete_thread(cls, user_id: int, thread_pub_id: str) -> bool:
@@ -19,27 +54,56 @@ class ForumService:
 
     @classmethod
     def can_update_delete_reply(cls, user_id: int, reply_pub_id: str) -> bool:
-        return True
+        # Owner controls are in every reader's html now, only hidden by css, so enforce ownership here.
+        try:
+            reply_id = resolver.resolve(Reply, reply_pub_id)
+        except Reply.DoesNotExist:
+            return False
+        return Reply.objects.filter(id=reply_id, created_by_id=user_id).exists()
 
     @classmethod
     def create_thread(cls, title: str, content: str, tags: list[str], user_id: int) -> Thread | None:
-        if Thread.objects.filter(title=title).exists():
+        # Rendered before queueing, so a slow render never holds the write lock.
+        return cls._create_thread(title, content, render_for_storage(content), tags, user_id)
+
+    @classmethod
+    @serialized_write
+    def _create_thread(
+        cls,
+        title: str,
+        content: str,
+        rendered: tuple[str, int],
+        tags: list[str],
+        user_id: int,
+    ) -> Thread | None:
+        # Deleted threads keep their title until purged.
+        if Thread.all_objects.filter(title=title).exists():
             return None
 
-        thread = Thread.objects.create(
-            title=title,
-            created_by_id=user_id,
-        )
+        with transaction.atomic():
+            thread = Thread.objects.create(
+                title=title,
+                created_by_id=user_id,
+            )
 
-        Reply.objects.create(
-            content=content,
-            thread_id=thread.id,
-            created_by_id=user_id,
-        )
+            reply = Reply(content=content, thread_id=thread.id, created_by_id=user_id)
+            reply.render_content(rendered)
+            reply.save(force_insert=True)
+
+            thread.last_reply_at = reply.created_at
+            thread.excerpt = Thread.make_excerpt(reply.content_html)
+            Thread.objects.filter(id=thread.id).update(
+                last_reply_at=thread.last_reply_at,
+                excerpt=thread.excerpt,
+            )
 
-        # TODO: Handle tags!
+            set_thread_tags(thread_id=thread.id, tags=tags)
+
+            search = get_search_engine()
+            search.index_thread(thread_id=thread.id, title=thread.title)
+            search.index_reply(reply_id=reply.id, thread_id=thread.id, content=reply.content)
+            bump_index_version()
 
-        # TODO: Index in search.
         return thread
 
     @classmethod
@@ -49,6 +113,19 @@ class ForumService:
         title: str | None = None,
         content: str | None = None,
         tags: list[str] | None = None,
+    ) -> Thread | None:
+        rendered = render_for_storage(content) if content is not None else None
+        return cls._update_thread(thread_pub_id, title=title, content=content, rendered=rendered, tags=tags)
+
+    @classmethod
+    @serialized_write
+    def _update_thread(
+        cls,
+        thread_pub_id: str,
+        title: str | None,
+        content: str | None,
+        rendered: tuple[str, int] | None,
+        tags: list[str] | None,
     ) -> Thread | None:
         if not cls.can_update_delete_thread(user_id=1, thread_pub_id=thread_pub_id):
             return None
@@ -56,75 +133,323 @@ class ForumService:
         if not cls.thread_exists(thread_pub_id=thread_pub_id):
             return None
 
-        # TODO: Update in db and index.
-        return
+        with transaction.atomic():
+            thread = Thread.objects.get(id=resolver.resolve(Thread, thread_pub_id))
+
+            if title is not None and title != thread.title:
+                if Thread.all_objects.filter(title=title).exclude(id=thread.id).exists():
+                    return None
+                thread.title = title
+                thread.save(update_fields=["title", "modified_at"])
+                get_search_engine().index_thread(thread_id=thread.id, title=thread.title)
+
+            if content is not None:
+                opening_post = thread.replies.order_by("created_at", "id").first()
+                cls._update_reply_content(reply=opening_post, content=content, rendered=rendered)
+
+            if tags is not None:
+                set_thread_tags(thread_id=thread.id, tags=tags)
+
+            bump_thread_version(thread_pub_id)
+        return thread
 
     @classmethod
     def get_thread(cls, thread_pub_id: str) -> ThreadSchema:
         # TODO: Handle 404.
-        q = Thread.objects.get(public_id=thread_pub_id)
-        return q.as_schema()
+        version = get_thread_version(thread_pub_id)
+        return get_or_compute(
+            "thread",
+            f"{thread_pub_id}:{version}",
+            lambda: Thread.schema_from_row(
+                Thread.schema_values(Thread.objects.filter(id=resolver.resolve(Thread, thread_pub_id))).get()
+            ),
+        )
 
     @classmethod
-    def get_threads(cls, limit: int = 25, page: int = 1) -> list[ThreadSchema]:
+    async def aget_thread(cls, thread_pub_id: str) -> ThreadSchema:
+        async def load() -> ThreadSchema:
+            thread_id = await resolver.aresolve(Thread, thread_pub_id)
+            row = await Thread.schema_values(Thread.objects.filter(id=thread_id)).aget()
+            content = None
+            if not is_stored_html_current(row["opening_content_html_version"]):
+                content = await arender_markdown(row["opening_content"])
+            return Thread.schema_from_row(row, content=content)
+
+        version = get_thread_version(thread_pub_id)
+        return await aget_or_compute("thread", f"{thread_pub_id}:{version}", load)
+
+    @classmethod
+    def get_threads(cls, limit: int = 25, cursor: str | None = None, order: str = "activity") -> Page:
+        """Page of threads, newest activity first. Raises ValueError on invalid cursor or order."""
         # TODO: Should return from search engine sorted by score/date.
-        return Thread.objects.all()
+        if order not in THREAD_ORDERINGS:
+            raise ValueError(f"Unknown thread order: {order!r}")
+
+        return keyset_paginate(
+            Thread.objects.select_related("created_by"),
+            field=THREAD_ORDERINGS[order],
+            limit=limit,
+            cursor=cursor,
+            descending=True,
+        )
+
+    @classmethod
+    async def aget_threads(cls, limit: int = 25, cursor: str | None = None, order: str = "activity") -> Page:
+        if order not in THREAD_ORDERINGS:
+            raise ValueError(f"Unknown thread order: {order!r}")
+
+        return await akeyset_paginate(
+            Thread.objects.select_related("created_by"),
+            field=THREAD_ORDERINGS[order],
+            limit=limit,
+            cursor=cursor,
+            descending=True,
+        )
 
     @classmethod
     def search_threads(
         cls,
         query: str,
+        limit: int = 20,
     ) -> list[dict]:
         """Search threads and replies by query, return a list of matching thread meta."""
-        # TODO: Maybe return thread meta like title, author, score, created_at to display in search results directly?
-        pass
+        with timed("search"):
+            hits = get_search_engine().search(query, limit=limit)
+        threads = Thread.objects.select_related("created_by").in_bulk([hit["thread_id"] for hit in hits])
+
+        results = []
+        for hit in hits:
+            thread = threads.get(hit["thread_id"])
+            if thread is None:
+                continue  # Deleted since indexing.
+            results.append({
+                "pub_id": thread.pub_id,
+                "title": thread.title,
+                "excerpt": thread.excerpt,
+                "created_by": thread.created_by.username,
+                "created_at": thread.created_at,
+                "reply_count": thread.reply_count,
+                "score": hit["score"],
+                "snippet": hit.get("snippet", ""),
+            })
+        return results
+
+    @classmethod
+    async def asearch_threads(cls, query: str, limit: int = 20) -> list[dict]:
+        # Search engines do file and socket io of their own, run them in a worker thread as a whole.
+        return await sync_to_async(cls.search_threads)(query=query, limit=limit)
+
+    @classmethod
+    def search_threads_by_tags(
+        cls,
+        tags: list[str],
+        match_all: bool = True,
+        limit: int = 25,
+        cursor: str | None = None,
+    ) -> Page:
+        """Page of threads having all (or any) of the tags, newest first. Raises ValueError on invalid cursor."""
+        return tag_index.query(tags, match_all=match_all, limit=limit, cursor=cursor)
 
     @classmethod
-    def search_threads_by_tags(cls, tags: list[str]) -> list[dict]:
-        pass
+    async def asearch_threads_by_tags(
+        cls,
+        tags: list[str],
+        match_all: bool = True,
+        limit: int = 25,
+        cursor: str | None = None,
+    ) -> Page:
+        return await sync_to_async(tag_index.query)(tags, match_all=match_all, limit=limit, cursor=cursor)
 
     @classmethod
+    @serialized_write
     def delete_thread(cls, thread_pub_id: str) -> bool:
         if not cls.can_update_delete_thread(user_id=1, thread_pub_id=thread_pub_id):
             return False
 
-        if not cls.thread_exists(thread_pub_id=thread_pub_id):
+        try:
+            thread_id = resolver.resolve(Thread, thread_pub_id)
+        except Thread.DoesNotExist:
             return False
 
-        # TODO: Delete in db and index.
+        # Hidden at once, the rows go in small batches later so the write lock is never held for long.
+        with transaction.atomic():
+            if not Thread.objects.filter(id=thread_id).update(deleted_at=timezone.now()):
+                return False  # Deleted meanwhile.
+            set_thread_tags(thread_id=thread_id, tags=[])
+            get_search_engine().remove_thread(thread_id=thread_id)
+            bump_thread_version(thread_pub_id)
+            bump_index_version()
+        resolver.forget(Thread, thread_pub_id)
+        return True
+
+    @classmethod
+    @serialized_write
+    def purge_deleted_thread(cls, thread_id: int, batch_size: int = 500) -> int:
+        """Delete up to batch_size replies of a soft deleted thread, the thread itself once none are left.
+
+        Every call is a transaction of its own. Returns the number of replies deleted, 0 once the thread is gone.
+        """
+        with transaction.atomic():
+            if not Thread.all_objects.filter(id=thread_id, deleted_at__isnull=False).exists():
+                return 0
+            batch = Reply.objects.filter(thread_id=thread_id).order_by("created_at", "id")[:batch_size]
+            deleted, _ = Reply.objects.filter(id__in=list(batch.values_list("id", flat=True))).delete()
+            if not deleted:
+                ThreadTag.objects.filter(thread_id=thread_id).delete()
+                Thread.all_objects.filter(id=thread_id).delete()
+                # Search engines without triggers dropped the thread when it was soft deleted already.
+                get_search_engine().remove_thread(thread_id=thread_id)
+        return deleted
 
     @classmethod
     def add_reply(cls, thread_pub_id: str, content: str, user_id: int) -> Reply:
-        reply = Reply.objects.create(
-            content=content,
-            thread_id=Thread.objects.get(public_id=thread_pub_id).id,
-            created_by_id=user_id,
-        )
-        # TODO: Index in search engine.
+        return cls._add_reply(thread_pub_id, content, render_for_storage(content), user_id)
+
+    @classmethod
+    @serialized_write
+    def _add_reply(cls, thread_pub_id: str, content: str, rendered: tuple[str, int], user_id: int) -> Reply:
+        with transaction.atomic():
+            reply = Reply(content=content, thread_id=resolver.resolve(Thread, thread_pub_id), created_by_id=user_id)
+            reply.render_content(rendered)
+            reply.save(force_insert=True)
+            updated = Thread.objects.filter(id=reply.thread_id).update(
+                reply_count=F("reply_count") + 1,
+                last_reply_at=reply.created_at,
+            )
+            if not updated:
+                raise Thread.DoesNotExist("Thread was deleted.")  # Rolls back the reply too.
+            get_search_engine().index_reply(reply_id=reply.id, thread_id=reply.thread_id, content=reply.content)
+            bump_thread_version(thread_pub_id)
         return reply
 
     @classmethod
-    def update_reply(cls, reply_pub_id: str, content: str) -> Reply | None:
-        if not cls.can_update_delete_reply(user_id=1, reply_pub_id=reply_pub_id):
+    def update_reply(cls, reply_pub_id: str, content: str, user_id: int) -> Reply | None:
+        return cls._update_reply(reply_pub_id, content, render_for_storage(content), user_id)
+
+    @classmethod
+    @serialized_write
+    def _update_reply(cls, reply_pub_id: str, content: str, rendered: tuple[str, int], user_id: int) -> Reply | None:
+        if not cls.can_update_delete_reply(user_id=user_id, reply_pub_id=reply_pub_id):
             return None
 
         if not cls.reply_exists(reply_pub_id=reply_pub_id):
             return None
 
-        # TODO: Update in db and index.
+        with transaction.atomic():
+            reply = Reply.objects.select_related("thread").get(id=resolver.resolve(Reply, reply_pub_id))
+            cls._update_reply_content(reply=reply, content=content, rendered=rendered)
+        return reply
 
     @classmethod
+    def _update_reply_content(cls, reply: Reply, content: str, rendered: tuple[str, int]) -> None:
+        reply.content = content
+        reply.render_content(rendered)
+        reply.save(update_fields=["content", "modified_at"])
+
+        first_id = Reply.objects.filter(thread_id=reply.thread_id).order_by("created_at", "id").values("id")[:1]
+        if reply.id == first_id.get()["id"]:
+            Thread.objects.filter(id=reply.thread_id).update(excerpt=Thread.make_excerpt(reply.content_html))
+
+        get_search_engine().index_reply(reply_id=reply.id, thread_id=reply.thread_id, content=reply.content)
+        bump_thread_version(str(reply.thread.public_id))
+
+    @classmethod
+    @serialized_write
     def delete_reply(cls, reply_pub_id: str, user_id: int) -> bool:
+        """Delete a reply of user_id, False when it is gone, not theirs or the opening post of its thread."""
         if not cls.can_update_delete_reply(user_id=user_id, reply_pub_id=reply_pub_id):
             return False
 
         if not cls.reply_exists(reply_pub_id=reply_pub_id):
             return False
 
-        Reply.objects.get(public_id=reply_pub_id).delete()
-        # TODO: Delete from search index.
+        with transaction.atomic():
+            reply = Reply.objects.select_related("thread").get(id=resolver.resolve(Reply, reply_pub_id))
+            first_id = Reply.objects.filter(thread_id=reply.thread_id).order_by("created_at", "id").values("id")[:1]
+            if reply.id == first_id.get()["id"]:
+                # The opening post goes with its thread, see delete_thread.
+                return False
+            reply_id = reply.id
+            reply.delete()
+            latest_reply = Reply.objects.filter(thread_id=reply.thread_id).order_by("-created_at", "-id")
+            Thread.objects.filter(id=reply.thread_id, reply_count__gt=0).update(
+                reply_count=F("reply_count") - 1,
+                last_reply_at=Coalesce(Subquery(latest_reply.values("created_at")[:1]), F("created_at")),
+            )
+            get_search_engine().remove_reply(reply_id=reply_id)
+            resolver.forget(Reply, reply_pub_id)
+            bump_thread_version(str(reply.thread.public_id))
+        return True
+
+    @staticmethod
+    def _visible_replies(thread_id: int):
+        # Other processes may still resolve a deleted thread's public id from their cache.
+        return Reply.objects.filter(thread_id=thread_id, thread__deleted_at__isnull=True)
+
+    @classmethod
+    def get_replies(cls, thread_pub_id: str, limit: int = 50, cursor: str | None = None) -> Page:
+        """Page of reply schemas in posting order, opening post first. Raises ValueError on invalid cursor."""
+
+        def load() -> Page:
+            q = Reply.schema_values(cls._visible_replies(resolver.resolve(Thread, thread_pub_id)))
+            page = keyset_paginate(q, field="created_at", limit=limit, cursor=cursor)
+            page.items = [Reply.schema_from_row(row) for row in page.items]
+            return page
+
+        version = get_thread_version(thread_pub_id)
+        return get_or_compute("replies", f"{thread_pub_id}:{version}:{limit}:{cursor}", load)
 
     @classmethod
-    def get_replies(cls, thread_pub_id: str) -> list[ThreadSchema]:
-        q = Reply.objects.filter(thread__public_id=thread_pub_id)
-        return [r.as_schema() for r in q]
+    async def aget_replies(cls, thread_pub_id: str, limit: int = 50, cursor: str | None = None) -> Page:
+        async def load() -> Page:
+            thread_id = await resolver.aresolve(Thread, thread_pub_id)
+            q = Reply.schema_values(cls._visible_replies(thread_id))
+            page = await akeyset_paginate(q, field="created_at", limit=limit, cursor=cursor)
+            items = []
+            for row in page.items:
+                content = None
+                if not is_stored_html_current(row["content_html_version"]):
+                    content = await arender_markdown(row["content"])
+                items.append(Reply.schema_from_row(row, content=content))
+            page.items = items
+            return page
+
+        version = get_thread_version(thread_pub_id)
+        return await aget_or_compute("replies", f"{thread_pub_id}:{version}:{limit}:{cursor}", load)
+
+    @classmethod
+    def iter_replies(cls, thread_pub_id: str, chunk_size: int = 200) -> Iterator[ReplySchema]:
+        """All replies of a thread in posting order, fetched chunk_size rows at a time, for streaming."""
+        thread_id = resolver.resolve(Thread, thread_pub_id)
+        q = Reply.schema_values(cls._visible_replies(thread_id).order_by("created_at", "id"))
+        for row in q.iterator(chunk_size=chunk_size):
+            yield Reply.schema_from_row(row)
+
+    @classmethod
+    def repair_thread_counters(cls, batch_size: int = 500) -> int:
+        """Recompute denormalized thread counters from replies, returns amount of threads updated."""
+        first_reply = Reply.objects.filter(thread_id=OuterRef("id")).order_by("created_at", "id")
+        q = (
+            Thread.objects.order_by("id")
+            .annotate(
+                _replies=Count("replies"),
+                _last_reply_at=Max("replies__created_at"),
+                _first_html=Subquery(first_reply.values("content_html")[:1]),
+            )
+        )
+
+        updated = 0
+        last_id = 0
+        while True:
+            threads = list(q.filter(id__gt=last_id)[:batch_size])
+            if not threads:
+                return updated
+            last_id = threads[-1].id
+
+            for t in threads:
+                t.reply_count = max(t._replies - 1, 0)
+                t.last_reply_at = t._last_reply_at or t.created_at
+                t.excerpt = Thread.make_excerpt(t._first_html or "")
+            with transaction.atomic():
+                Thread.objects.bulk_update(threads, ["reply_count", "last_reply_at", "excerpt"])
+            updated += len(threads)
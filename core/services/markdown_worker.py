@@ -0,0 +1,48 @@
+"""Markdown rendering as it runs inside the worker processes of core.services.render.
+
+Nothing from Django is imported here, so a worker process starts fast and holds no database
+connections or settings.
+"""
+
+import os
+
+import markdown2
+import nh3
+
+MARKDOWN_EXTRAS = [
+    "fenced-code-blocks",
+    "tables",
+    "strike",
+    "cuddled-lists",
+]
+
+
+def render_html(content: str) -> str:
+    return nh3.clean(markdown2.markdown(content, extras=MARKDOWN_EXTRAS))
+
+
+def worker_main(conn, memory_limit: int | None) -> None:
+    """Render batches received on conn until it closes, sending back each html, or None where the render raised."""
+    # Behind the web workers for CPU, and capped in memory so one input can not exhaust the host.
+    os.nice(10)
+    if memory_limit:
+        try:
+            import resource
+
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        except (ImportError, OSError, ValueError):
+            pass
+
+    conn.send("ready")
+    while True:
+        try:
+            contents = conn.recv()
+        except EOFError:
+            return
+        # One message per render, so the parent can time every render on its own.
+        for content in contents:
+            try:
+                html = render_html(content)
+            except Exception:  # MemoryError and RecursionError included.
+                html = None
+            conn.send(html)
@@ -0,0 +1,236 @@
+import json
+import logging
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from core.models import Reply, SearchOutbox, Thread
+from core.services.search_cache import result_cache
+
+_logger = logging.getLogger("forumukas")
+
+
+class MeilisearchError(Exception):
+    pass
+
+
+class MeilisearchRejected(MeilisearchError):
+    """Meilisearch refused the request or failed its task, sending it again will not help."""
+
+
+class MeilisearchClient:
+    """Minimal client for the parts of the Meilisearch HTTP API we use."""
+
+    def __init__(self, url: str | None = None, api_key: str | None = None, index: str | None = None, timeout: float = 10):
+        self.url = (url or settings.MEILISEARCH_URL).rstrip("/")
+        self.api_key = api_key if api_key is not None else settings.MEILISEARCH_API_KEY
+        self.index = index or settings.MEILISEARCH_INDEX
+        self.timeout = timeout
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        body = {
+            "q": query,
+            "limit": limit,
+            "attributesToRetrieve": ["thread_id"],
+            "showRankingScore": True,
+        }
+        return self._request("POST", f"/indexes/{self.index}/search", body)["hits"]
+
+    def configure_index(self) -> None:
+        self._request("PATCH", f"/indexes/{self.index}/settings", {
+            "searchableAttributes": ["text"],
+            "filterableAttributes": ["thread_id"],
+        })
+
+    # Writes return the uid of the task Meilisearch applies them in, see wait_for_tasks.
+
+    def add_documents(self, documents: list[dict]) -> int:
+        return self._request("POST", f"/indexes/{self.index}/documents?primaryKey=id", documents)["taskUid"]
+
+    def delete_documents(self, ids: list[str]) -> int:
+        return self._request("POST", f"/indexes/{self.index}/documents/delete-batch", ids)["taskUid"]
+
+    def delete_thread_documents(self, thread_ids: list[int]) -> int:
+        body = {"filter": f"thread_id IN {thread_ids}"}
+        return self._request("POST", f"/indexes/{self.index}/documents/delete", body)["taskUid"]
+
+    def delete_all_documents(self) -> int:
+        return self._request("DELETE", f"/indexes/{self.index}/documents")["taskUid"]
+
+    def wait_for_tasks(self, task_uids: list[int]) -> None:
+        """Wait until the tasks are applied. Raises MeilisearchRejected if one failed."""
+        deadline = time.monotonic() + self.timeout
+        for task_uid in task_uids:
+            delay = 0.01
+            while True:
+                task = self._request("GET", f"/tasks/{task_uid}")
+                if task["status"] == "succeeded":
+                    break
+                if task["status"] in ("failed", "canceled"):
+                    raise MeilisearchRejected(f"Task {task_uid} {task['status']}: {task.get('error')}")
+                if time.monotonic() > deadline:
+                    raise MeilisearchError(f"Task {task_uid} still {task['status']} after {self.timeout}s.")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+
+    def _request(self, method: str, path: str, body=None) -> dict:
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method)
+        request.add_header("Content-Type", "application/json")
+        if self.api_key:
+            request.add_header("Authorization", f"Bearer {self.api_key}")
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = response.read()
+        except urllib.error.HTTPError as e:
+            # Client errors other than timeouts and rate limits are about the request itself.
+            error = MeilisearchRejected if 400 <= e.code < 500 and e.code not in (408, 429) else MeilisearchError
+            raise error(f"{method} {path} failed: {e.code} {e.read()[:500]!r}") from e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise MeilisearchError(f"{method} {path} failed: {e}") from e
+        return json.loads(payload) if payload else {}
+
+
+class OutboxDrainer:
+    """Pushes SearchOutbox entries to Meilisearch in coalesced bulk requests.
+
+    Batches Meilisearch rejects are split in halves until the rejected entries are found, those count
+    an attempt and are skipped for good after MAX_ATTEMPTS. They stay in the outbox for inspection,
+    until a later entry for the same document is pushed: retrying them then would undo newer state.
+    """
+
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, client: MeilisearchClient | None = None, batch_size: int = 500):
+        self.client = client or MeilisearchClient()
+        self.batch_size = batch_size
+
+    def drain_batch(self) -> int:
+        """Push one batch, returns amount of outbox entries handled.
+
+        Raises MeilisearchError when Meilisearch is unavailable, the entries are kept for the next try then.
+        """
+        entries = list(SearchOutbox.objects.filter(attempts__lt=self.MAX_ATTEMPTS).order_by("id")[: self.batch_size])
+        if not entries:
+            return 0
+
+        pushed = self._push_or_split(entries)
+        self._forget(pushed)
+        # Results cached while these were queued are stale now.
+        result_cache.invalidate()
+        return len(entries)
+
+    def _push_or_split(self, entries: list[SearchOutbox]) -> list[SearchOutbox]:
+        """Push entries in order, returns those pushed."""
+        try:
+            self._push(entries)
+            return entries
+        except MeilisearchRejected as e:
+            if len(entries) == 1:
+                _logger.error("Search outbox entry %s rejected: %s", entries[0].id, e)
+                SearchOutbox.objects.filter(id=entries[0].id).update(attempts=F("attempts") + 1)
+                return []
+            half = len(entries) // 2
+            return self._push_or_split(entries[:half]) + self._push_or_split(entries[half:])
+
+    @staticmethod
+    def _forget(pushed: list[SearchOutbox]) -> None:
+        """Delete pushed entries, and rejected earlier ones for the same documents they superseded."""
+        if not pushed:
+            return
+        SearchOutbox.objects.filter(id__in=[e.id for e in pushed]).delete()
+
+        newest = {(e.kind, e.object_id): e.id for e in pushed}  # Entries are in id order.
+        reindexed = newest.get((SearchOutbox.KIND_INDEX, None), 0)
+        rejected = SearchOutbox.objects.filter(attempts__gt=0, id__lt=max(newest.values()))
+        superseded = [
+            entry_id
+            for entry_id, kind, object_id in rejected.values_list("id", "kind", "object_id")
+            if entry_id < reindexed or entry_id < newest.get((kind, object_id), 0)
+        ]
+        SearchOutbox.objects.filter(id__in=superseded).delete()
+
+    def _push(self, entries: list[SearchOutbox]) -> None:
+        # A full reindex makes everything queued before it irrelevant.
+        for i in range(len(entries) - 1, -1, -1):
+            if entries[i].kind == SearchOutbox.KIND_INDEX:
+                self.client.wait_for_tasks([self.client.delete_all_documents()])
+                entries = entries[i + 1:]
+                break
+
+        # Only the latest operation per document matters.
+        latest: dict[tuple[str, int], str] = {}
+        for e in entries:
+            latest[(e.kind, e.object_id)] = e.op
+
+        thread_ids = {object_id for (kind, object_id), op in latest.items() if kind == SearchOutbox.KIND_THREAD}
+        reply_ids = {object_id for (kind, object_id), op in latest.items() if kind == SearchOutbox.KIND_REPLY}
+
+        documents = []
+        threads = Thread.objects.filter(id__in=thread_ids).values_list("id", "title")
+        for thread_id, title in threads:
+            if latest[(SearchOutbox.KIND_THREAD, thread_id)] == SearchOutbox.OP_UPSERT:
+                documents.append({"id": f"thread-{thread_id}", "thread_id": thread_id, "text": title})
+        # Replies of soft deleted threads go out with their thread.
+        replies = Reply.objects.filter(id__in=reply_ids, thread__deleted_at__isnull=True).values_list(
+            "id", "thread_id", "content"
+        )
+        for reply_id, thread_id, content in replies:
+            if latest[(SearchOutbox.KIND_REPLY, reply_id)] == SearchOutbox.OP_UPSERT:
+                documents.append({"id": f"reply-{reply_id}", "thread_id": thread_id, "text": content})
+
+        # Deleted explicitly or gone from the database before we got to it.
+        upserted = {doc["id"] for doc in documents}
+        deleted_threads = [
+            object_id
+            for (kind, object_id), op in latest.items()
+            if kind == SearchOutbox.KIND_THREAD and op == SearchOutbox.OP_DELETE
+        ]
+        deleted_docs = [
+            f"{kind}-{object_id}"
+            for (kind, object_id), op in latest.items()
+            if kind != SearchOutbox.KIND_INDEX and f"{kind}-{object_id}" not in upserted
+        ]
+
+        # Meilisearch applies tasks in order, thread deletes go last so they win over any reply upsert.
+        tasks = []
+        if deleted_docs:
+            tasks.append(self.client.delete_documents(deleted_docs))
+        if documents:
+            tasks.append(self.client.add_documents(documents))
+        if deleted_threads:
+            tasks.append(self.client.delete_thread_documents(deleted_threads))
+        # Meilisearch accepts writes before applying them, failures only show in their tasks.
+        self.client.wait_for_tasks(tasks)
+
+        _logger.info("Pushed %s documents, deleted %s to search index.", len(documents), len(deleted_docs))
+
+
+def enqueue(kind: str, op: str, object_id: int | None = None) -> None:
+    SearchOutbox.objects.create(kind=kind, op=op, object_id=object_id)
+
+
+def enqueue_rebuild(batch_size: int = 2000) -> int:
+    """Queue a full reindex, returns amount of documents queued."""
+    queued = 0
+    with transaction.atomic():
+        enqueue(SearchOutbox.KIND_INDEX, SearchOutbox.OP_UPSERT)
+        # Soft deleted threads and their replies stay out.
+        replies = Reply.objects.filter(thread__deleted_at__isnull=True)
+        for q, kind in ((Thread.objects, SearchOutbox.KIND_THREAD), (replies, SearchOutbox.KIND_REPLY)):
+            ids = q.order_by().values_list("id", flat=True).iterator(chunk_size=batch_size)
+            batch = []
+            for object_id in ids:
+                batch.append(SearchOutbox(kind=kind, op=SearchOutbox.OP_UPSERT, object_id=object_id))
+                if len(batch) == batch_size:
+                    SearchOutbox.objects.bulk_create(batch)
+                    queued += len(batch)
+                    batch = []
+            SearchOutbox.objects.bulk_create(batch)
+            queued += len(batch)
+    return queued
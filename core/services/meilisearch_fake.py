@@ -0,0 +1,121 @@
+"""In-memory stand-in for the Meilisearch HTTP API, for developing and testing offline.
+
+Implements only what MeilisearchClient uses. Ranking is a plain term overlap score.
+"""
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from core.services.search import tokenize
+
+_INDEX_PATH_RE = re.compile(r"^/indexes/(?P<index>[\w-]+)(?P<rest>/.*)?$")
+_FILTER_RE = re.compile(r"^thread_id IN \[(?P<ids>[\d, ]*)\]$")
+_TASK_PATH_RE = re.compile(r"^/tasks/(?P<uid>\d+)$")
+_DOCUMENT_ID_RE = re.compile(r"^[\w-]{1,511}$")
+
+
+class FakeMeilisearch:
+    def __init__(self):
+        self.indexes: dict[str, dict[str, dict]] = {}
+        self.lock = threading.Lock()
+        self.task_uid = 0
+        self.tasks: dict[int, dict] = {}
+
+    def handle(self, method: str, path: str, body) -> tuple[int, dict]:
+        if path == "/health":
+            return 200, {"status": "available"}
+
+        task_match = _TASK_PATH_RE.match(path)
+        if method == "GET" and task_match:
+            with self.lock:
+                task = self.tasks.get(int(task_match["uid"]))
+            if task is None:
+                return 404, {"message": f"Task {task_match['uid']} not found.", "code": "task_not_found"}
+            return 200, task
+
+        match = _INDEX_PATH_RE.match(path)
+        if not match:
+            return 404, {"message": f"Unknown route {path}"}
+
+        with self.lock:
+            docs = self.indexes.setdefault(match["index"], {})
+            route = (method, match["rest"] or "")
+
+            if route == ("POST", "/search"):
+                return 200, self._search(docs, body)
+            if route == ("PATCH", "/settings"):
+                pass
+            elif route == ("POST", "/documents"):
+                # Like Meilisearch, a bad document fails the whole task, which is accepted nonetheless.
+                bad = [doc.get("id") for doc in body if not _DOCUMENT_ID_RE.match(str(doc.get("id", "")))]
+                if bad:
+                    error = {"message": f"Invalid document id {bad[0]!r}.", "code": "invalid_document_id"}
+                    return 202, self._task("failed", error)
+                for doc in body:
+                    docs[str(doc["id"])] = doc
+            elif route == ("POST", "/documents/delete-batch"):
+                for doc_id in body:
+                    docs.pop(str(doc_id), None)
+            elif route == ("POST", "/documents/delete"):
+                ids = {int(i) for i in _FILTER_RE.match(body["filter"])["ids"].split(",") if i.strip()}
+                for doc_id in [doc_id for doc_id, doc in docs.items() if doc.get("thread_id") in ids]:
+                    del docs[doc_id]
+            elif route == ("DELETE", "/documents"):
+                docs.clear()
+            else:
+                return 404, {"message": f"Unknown route {method} {path}"}
+
+            return 202, self._task("succeeded")
+
+    def _task(self, status: str, error: dict | None = None) -> dict:
+        # Applied at once, the task is finished by the time anyone asks.
+        self.task_uid += 1
+        self.tasks[self.task_uid] = {"uid": self.task_uid, "status": status, "error": error}
+        return {"taskUid": self.task_uid, "status": "enqueued"}
+
+    @staticmethod
+    def _search(docs: dict[str, dict], body: dict) -> dict:
+        terms = set(tokenize(body.get("q", "")))
+        scored = []
+        for doc in docs.values():
+            tokens = tokenize(doc.get("text", ""))
+            overlap = len(terms.intersection(tokens))
+            if overlap:
+                scored.append((overlap / len(terms), doc))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        attributes = body.get("attributesToRetrieve")
+        hits = []
+        for score, doc in scored[: body.get("limit", 20)]:
+            hit = {k: v for k, v in doc.items() if attributes is None or k in attributes}
+            if body.get("showRankingScore"):
+                hit["_rankingScore"] = score
+            hits.append(hit)
+        return {"hits": hits, "query": body.get("q", ""), "estimatedTotalHits": len(scored)}
+
+
+def make_server(host: str = "127.0.0.1", port: int = 7700) -> ThreadingHTTPServer:
+    fake = FakeMeilisearch()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _dispatch(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            status, payload = fake.handle(self.command, urlparse(self.path).path, body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = do_DELETE = _dispatch
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.fake = fake
+    return server
@@ -0,0 +1,151 @@
+"""Fleet wide counters and histograms in Prometheus text format.
+
+Every process counts into plain dicts under a lock, and every FLUSH_INTERVAL seconds adds what it
+counted since the last flush to a diskcache Index shared by all worker processes. The Index is a
+SQLite file, so increments from concurrent flushes are serialized by its transactions.
+"""
+
+import atexit
+import math
+import re
+import threading
+import time
+
+from diskcache import Index
+from django.conf import settings
+
+COUNTER = "counter"
+HISTOGRAM = "histogram"
+
+METRICS = {
+    "forum_requests_total": (COUNTER, "Requests by view and status class."),
+    "forum_request_duration_seconds": (HISTOGRAM, "Request latency by view."),
+    "forum_phase_seconds_total": (COUNTER, "Time spent per request phase (sql, lock_wait, markdown, template...)."),
+    "forum_phase_calls_total": (COUNTER, "Calls per request phase, sql calls are ORM queries."),
+    "forum_search_duration_seconds": (HISTOGRAM, "Search time of requests that searched."),
+    "forum_cache_requests_total": (COUNTER, "ForumService cache lookups by namespace and result."),
+    "forum_search_cache_requests_total": (COUNTER, "Search result cache lookups by result (memory, disk, miss)."),
+    "forum_render_fallbacks_total": (COUNTER, "Posts shown as plain text, by reason (size, timeout, crash, busy)."),
+}
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+FLUSH_INTERVAL = 5.0
+
+_LE_RE = re.compile(r',?le="([^"]+)"')
+
+
+class Registry:
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._pending: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._index: Index | None = None
+
+    def inc(self, name: str, labels: dict, value: float = 1.0) -> None:
+        key = _series(name, labels)
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: dict, value: float) -> None:
+        """Add value to a histogram, buckets are cumulative like Prometheus expects them."""
+        keys = [_series(f"{name}_bucket", {**labels, "le": _format_le(le)}) for le in BUCKETS if value <= le]
+        keys.append(_series(f"{name}_count", labels))
+        with self._lock:
+            for key in keys:
+                self._pending[key] = self._pending.get(key, 0.0) + 1
+            key = _series(f"{name}_sum", labels)
+            self._pending[key] = self._pending.get(key, 0.0) + value
+
+    def maybe_flush(self) -> None:
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        index = self._get_index()
+        with index.transact():
+            for key, value in pending.items():
+                index[key] = index.get(key, 0.0) + value
+
+    def render(self) -> str:
+        """All processes' series in Prometheus text exposition format."""
+        self.flush()
+        index = self._get_index()
+        with index.transact():
+            series = dict(index.items())
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            names = (name,) if kind == COUNTER else (f"{name}_bucket", f"{name}_sum", f"{name}_count")
+            rows = sorted((key for key in series if key.partition("{")[0] in names), key=_sort_key)
+            if not rows:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{key} {_format_value(series[key])}" for key in rows)
+        return "\n".join(lines) + "\n"
+
+    def _get_index(self) -> Index:
+        if self._index is None:
+            self._index = Index(self.path)
+        return self._index
+
+
+def _series(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    pairs = ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items())
+    return f"{name}{{{pairs}}}"
+
+
+def _sort_key(key: str) -> tuple:
+    # Group series by labels with buckets in ascending le order.
+    match = _LE_RE.search(key)
+    if match is None:
+        return _LE_RE.sub("", key), 0.0
+    return _LE_RE.sub("", key), float(match.group(1).replace("+Inf", "inf"))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_le(le: float) -> str:
+    return "+Inf" if le == math.inf else repr(le)
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+registry: Registry | None = None
+if settings.FORUM_METRICS_ENABLED:
+    registry = Registry(str(settings.FORUM_METRICS_DIR))
+    atexit.register(registry.flush)
+
+
+def inc(name: str, labels: dict, value: float = 1.0) -> None:
+    if registry is not None:
+        registry.inc(name, labels, value)
+
+
+def observe_request(view: str, status: int, timer) -> None:
+    """Record one finished request from its RequestTimer."""
+    if registry is None:
+        return
+    registry.inc("forum_requests_total", {"view": view, "status": f"{status // 100}xx"})
+    registry.observe("forum_request_duration_seconds", {"view": view}, timer.elapsed)
+    for phase, (seconds, calls) in timer.phases.items():
+        registry.inc("forum_phase_seconds_total", {"view": view, "phase": phase}, seconds)
+        registry.inc("forum_phase_calls_total", {"view": view, "phase": phase}, calls)
+    if "search" in timer.phases:
+        registry.observe("forum_search_duration_seconds", {"view": view}, timer.phases["search"][0])
+    registry.maybe_flush()
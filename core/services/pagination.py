@@ -0,0 +1,79 @@
+import base64
+import dataclasses
+import datetime
+import json
+
+from django.db.models import Q, QuerySet
+
+
+@dataclasses.dataclass
+class Page:
+    items: list
+    next_cursor: str | None = None
+
+
+def encode_cursor(value: datetime.datetime, pk: int) -> str:
+    raw = json.dumps([value.isoformat(), pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """Raises ValueError on cursors that were not produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        return datetime.datetime.fromisoformat(value), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def keyset_paginate(
+    queryset: QuerySet,
+    field: str,
+    limit: int,
+    cursor: str | None = None,
+    descending: bool = False,
+) -> Page:
+    """Seek pagination over (field, id), every page costs the same as the first.
+
+    Unlike OFFSET based pagination no rows before the cursor are read and no COUNT(*) is run.
+    Works on values() querysets too, as long as field and id are selected.
+    """
+    queryset = _seek(queryset, field, cursor, descending)
+    return _to_page(list(queryset[: limit + 1]), field, limit)
+
+
+async def akeyset_paginate(
+    queryset: QuerySet,
+    field: str,
+    limit: int,
+    cursor: str | None = None,
+    descending: bool = False,
+) -> Page:
+    """Async keyset_paginate."""
+    queryset = _seek(queryset, field, cursor, descending)
+    return _to_page([row async for row in queryset[: limit + 1]], field, limit)
+
+
+def _seek(queryset: QuerySet, field: str, cursor: str | None, descending: bool) -> QuerySet:
+    if descending:
+        queryset = queryset.order_by(f"-{field}", "-id")
+    else:
+        queryset = queryset.order_by(field, "id")
+
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        op = "lt" if descending else "gt"
+        queryset = queryset.filter(Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"id__{op}": pk}))
+    return queryset
+
+
+def _to_page(rows: list, field: str, limit: int) -> Page:
+    if len(rows) <= limit:
+        return Page(items=rows)
+
+    rows = rows[:limit]
+    last = rows[-1]
+    if isinstance(last, dict):  # values() querysets.
+        return Page(items=rows, next_cursor=encode_cursor(last[field], last["id"]))
+    return Page(items=rows, next_cursor=encode_cursor(getattr(last, field), last.id))
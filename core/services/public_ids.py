@@ -0,0 +1,138 @@
+"""Public ids: time ordered UUIDs, shown as 22 character base62 strings and stored as 16 bytes.
+
+The UUIDs follow the version 7 layout, 48 bits of unix milliseconds then random bits, so new
+rows land at the end of the public_id index instead of at random pages of it. Base62 keeps the
+order, URLs sort like the ids do. Old style hex and dashed UUIDs are still accepted.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import models
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+LENGTH = 22  # 62**22 > 2**128
+_VALUES = {char: value for value, char in enumerate(ALPHABET)}
+
+
+def new_uuid() -> uuid.UUID:
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10))
+    value = value & ~(0xF << 76) | 0x7 << 76  # Version 7.
+    value = value & ~(0x3 << 62) | 0x2 << 62  # RFC 4122 variant.
+    return uuid.UUID(int=value)
+
+
+def encode(value: uuid.UUID) -> str:
+    number = value.int
+    chars = []
+    for _ in range(LENGTH):
+        number, digit = divmod(number, 62)
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def decode(value) -> uuid.UUID:
+    """UUID of a base62, hex or dashed public id. Raises ValueError on anything else."""
+    if isinstance(value, uuid.UUID):
+        return value
+    value = str(value)
+    if len(value) != LENGTH:
+        return uuid.UUID(value)
+    number = 0
+    for char in value:
+        try:
+            number = number * 62 + _VALUES[char]
+        except KeyError:
+            raise ValueError(f"Invalid public id: {value!r}") from None
+    if number >= 1 << 128:
+        raise ValueError(f"Invalid public id: {value!r}")
+    return uuid.UUID(int=number)
+
+
+class PublicIdField(models.UUIDField):
+    """UUIDField stored as 16 bytes rather than 32 hex characters, halving the column and its index.
+
+    Lookups accept the base62 form too, e.g. Thread.objects.get(public_id=thread_pub_id).
+    """
+
+    def get_internal_type(self) -> str:
+        return "BinaryField"
+
+    def to_python(self, value):
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        if isinstance(value, (bytes, memoryview)):
+            return uuid.UUID(bytes=bytes(value))
+        try:
+            return decode(value)
+        except ValueError:
+            return super().to_python(value)  # Raises the usual ValidationError.
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = self.to_python(value)
+        return None if value is None else value.bytes
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+
+class PublicIdResolver:
+    """Bounded LRU of public id -> primary key, per model.
+
+    Neither ever changes and SQLite never reuses primary keys, so entries can not go stale.
+    A deleted row's pk simply matches nothing anymore.
+    """
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pks: OrderedDict[tuple[str, uuid.UUID], int] = OrderedDict()
+
+    def resolve(self, model, public_id) -> int:
+        """Primary key of the row, raises model.DoesNotExist for unknown and malformed ids."""
+        key = self._key(model, public_id)
+        pk = self._get(key)
+        if pk is None:
+            pk = model.objects.filter(public_id=key[1]).values_list("pk", flat=True).get()
+            self._set(key, pk)
+        return pk
+
+    async def aresolve(self, model, public_id) -> int:
+        key = self._key(model, public_id)
+        pk = self._get(key)
+        if pk is None:
+            pk = await model.objects.filter(public_id=key[1]).values_list("pk", flat=True).aget()
+            self._set(key, pk)
+        return pk
+
+    def forget(self, model, public_id) -> None:
+        with self._lock:
+            self._pks.pop(self._key(model, public_id), None)
+
+    @staticmethod
+    def _key(model, public_id) -> tuple[str, uuid.UUID]:
+        try:
+            return model._meta.label, decode(public_id)
+        except ValueError:
+            raise model.DoesNotExist(f"Invalid public id: {public_id!r}") from None
+
+    def _get(self, key) -> int | None:
+        with self._lock:
+            pk = self._pks.get(key)
+            if pk is not None:
+                self._pks.move_to_end(key)
+            return pk
+
+    def _set(self, key, pk: int) -> None:
+        with self._lock:
+            self._pks[key] = pk
+            self._pks.move_to_end(key)
+            while len(self._pks) > self.max_size:
+                self._pks.popitem(last=False)
+
+
+resolver = PublicIdResolver(max_size=settings.FORUM_PUBLIC_ID_CACHE_SIZE)
@@ -0,0 +1,235 @@
+"""Markdown rendering in a bounded pool of worker processes.
+
+markdown2 is slow on some inputs (deep nesting, huge tables, long backtick runs). Each web process
+keeps FORUM_RENDER_WORKERS worker processes, so at most that many renders run at once. Content over
+FORUM_RENDER_MAX_CHARS, renders slower than FORUM_RENDER_TIMEOUT, renders that crash their worker
+and renders that find no free worker within FORUM_RENDER_WAIT_TIMEOUT fall back to escaped plain text.
+The worker of a timed out render is killed and replaced.
+Where no worker can be started, e.g. in daemonic processes, markdown is rendered in process.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils.html import linebreaks
+
+from core.services import metrics
+from core.services.markdown_worker import render_html, worker_main
+from core.services.timing import timed
+
+# Bump whenever markdown_worker.MARKDOWN_EXTRAS or the sanitizer config changes, stored replies
+# rendered with an older version are re-rendered by `manage.py rerender_replies`.
+RENDERER_VERSION = 1
+# Stored with fallback html. Reads serve it as is, so a pathological post costs one timeout when
+# saved rather than one per read, rerender_replies tries markdown again. 0 means not rendered yet.
+FALLBACK_VERSION = 32767  # Largest PositiveSmallIntegerField value, out of reach of RENDERER_VERSION.
+
+BATCH_SIZE = 100
+STARTUP_TIMEOUT = 30.0  # Seconds for a new worker to start, not counted against the render timeout.
+
+_logger = logging.getLogger("forumukas")
+
+
+def is_stored_html_current(version: int) -> bool:
+    """Whether html stored with this version is served without rendering again."""
+    return version in (RENDERER_VERSION, FALLBACK_VERSION)
+
+
+def fallback_html(content: str) -> str:
+    """Escaped plain text with paragraphs and line breaks, shown when markdown could not be rendered."""
+    return linebreaks(content, autoescape=True)
+
+
+class PoolUnavailable(Exception):
+    """No worker processes can be started in this process, render in it instead."""
+
+
+class _Worker:
+    def __init__(self, memory_limit: int | None):
+        # Spawned rather than forked, forking a process with a writer thread and open connections is unsafe.
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+        if not self.conn.poll(STARTUP_TIMEOUT):
+            self.kill()
+            raise OSError("Markdown worker did not start.")
+        self.conn.recv()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class RenderPool:
+    def __init__(self, size: int, timeout: float, memory_limit: int | None = None, wait_timeout: float | None = None):
+        self.size = size
+        self.timeout = timeout
+        self.wait_timeout = wait_timeout
+        self.memory_limit = memory_limit
+        self._lock = threading.Lock()
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._pid: int | None = None
+        self._broken_pid: int | None = None
+
+    @property
+    def available(self) -> bool:
+        # Daemonic processes, e.g. multiprocessing.Pool workers, may not have children.
+        return self._broken_pid != os.getpid() and not multiprocessing.current_process().daemon
+
+    def render(self, contents: list[str]) -> list[str | None]:
+        """Rendered html per content, None where the render failed or ran out of time.
+
+        Every render gets FORUM_RENDER_TIMEOUT of its own, all fail when no worker frees up within
+        FORUM_RENDER_WAIT_TIMEOUT. Raises PoolUnavailable when no worker can be started.
+        """
+        if not self.available:
+            raise PoolUnavailable
+        self._ensure_started()
+        results = []
+        while len(results) < len(contents):
+            try:
+                # One slot per worker, None until first needed. Last in first out, so warm workers get reused.
+                worker = self._idle.get(timeout=self.wait_timeout)
+            except queue.Empty:
+                remaining = len(contents) - len(results)
+                _logger.warning("No markdown worker free, %s posts shown as plain text.", remaining)
+                metrics.inc("forum_render_fallbacks_total", {"reason": "busy"}, remaining)
+                results.extend([None] * remaining)
+                break
+            # A failed render costs its worker, the rest of the batch goes to a fresh one.
+            results.extend(self._render_until_failure(worker, contents[len(results) :]))
+        return results
+
+    def _render_until_failure(self, worker: _Worker | None, contents: list[str]) -> list[str | None]:
+        """Renders of contents, up to and including one that timed out or killed the worker."""
+        results = []
+        healthy = False
+        try:
+            if worker is None:
+                worker = self._start_worker()
+            worker.conn.send(contents)
+            for content in contents:
+                if not worker.conn.poll(self.timeout):
+                    _logger.warning("Markdown render of %s chars timed out.", len(content))
+                    metrics.inc("forum_render_fallbacks_total", {"reason": "timeout"})
+                    results.append(None)
+                    break
+                results.append(worker.conn.recv())
+            else:
+                healthy = True
+        except (EOFError, OSError):
+            _logger.warning("Markdown worker died rendering %s chars.", len(contents[len(results)]))
+            metrics.inc("forum_render_fallbacks_total", {"reason": "crash"})
+            results.append(None)
+        finally:
+            if not healthy and worker is not None:
+                # Failed part way, its remaining output is of no use.
+                worker.kill()
+            self._idle.put(worker if healthy else None)
+        return results
+
+    def _start_worker(self) -> _Worker:
+        try:
+            return _Worker(self.memory_limit)
+        except Exception as e:
+            _logger.exception("Could not start a markdown worker, rendering in process from now on.")
+            self._broken_pid = os.getpid()
+            raise PoolUnavailable from e
+
+    def _ensure_started(self) -> None:
+        # Workers are not inherited by forked web workers, each process gets its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._idle = queue.LifoQueue()
+                for _ in range(self.size):
+                    self._idle.put(None)
+                self._pid = os.getpid()
+
+
+_pool = (
+    RenderPool(
+        size=settings.FORUM_RENDER_WORKERS,
+        timeout=settings.FORUM_RENDER_TIMEOUT,
+        memory_limit=settings.FORUM_RENDER_MEMORY_MB * 1024 * 1024 if settings.FORUM_RENDER_MEMORY_MB else None,
+        wait_timeout=settings.FORUM_RENDER_WAIT_TIMEOUT,
+    )
+    if settings.FORUM_RENDER_WORKERS
+    else None
+)
+
+# Threads waiting on the pool for async views and batch renders, no more than there are workers to wait on.
+_executor = ThreadPoolExecutor(max_workers=max(settings.FORUM_RENDER_WORKERS, 1), thread_name_prefix="render")
+
+
+def _render_inline(content: str) -> str | None:
+    # No time limit here, only the size limit.
+    try:
+        return render_html(content)
+    except Exception:
+        _logger.warning("Markdown render of %s chars failed.", len(content), exc_info=True)
+        metrics.inc("forum_render_fallbacks_total", {"reason": "crash"})
+        return None
+
+
+def _render_in_pool(contents: list[str]) -> list[str | None]:
+    if _pool is None:
+        raise PoolUnavailable
+    return _pool.render(contents)
+
+
+def _render_batch(contents: list[str]) -> list[tuple[str, int]]:
+    html = [None] * len(contents)
+    todo = [i for i, content in enumerate(contents) if len(content) <= settings.FORUM_RENDER_MAX_CHARS]
+    if len(todo) < len(contents):
+        metrics.inc("forum_render_fallbacks_total", {"reason": "size"}, len(contents) - len(todo))
+
+    if todo:
+        try:
+            rendered = _render_in_pool([contents[i] for i in todo])
+        except PoolUnavailable:
+            rendered = [_render_inline(contents[i]) for i in todo]
+        for i, r in zip(todo, rendered):
+            html[i] = r
+
+    return [
+        (r, RENDERER_VERSION) if r is not None else (fallback_html(content), FALLBACK_VERSION)
+        for r, content in zip(html, contents)
+    ]
+
+
+def render_markdown(content: str) -> str:
+    """Render user supplied markdown into sanitized html."""
+    return render_for_storage(content)[0]
+
+
+def render_for_storage(content: str) -> tuple[str, int]:
+    """Sanitized html and the renderer version to store it with, FALLBACK_VERSION for plain text fallbacks."""
+    with timed("markdown"):
+        return _render_batch([content])[0]
+
+
+def render_many(contents: list[str]) -> list[tuple[str, int]]:
+    """render_for_storage for many contents, in batches spread over all workers."""
+    batches = [contents[i : i + BATCH_SIZE] for i in range(0, len(contents), BATCH_SIZE)]
+    with timed("markdown"):
+        return [html for batch in _executor.map(_render_batch, batches) for html in batch]
+
+
+async def arender_markdown(content: str) -> str:
+    """render_markdown off the event loop."""
+    # Executors do not carry context variables over, the request timer needs them.
+    call = functools.partial(contextvars.copy_context().run, render_markdown, content)
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
@@ -1,23 +1,690 @@
-# TODO: Search engine wrappers
-# TODO: Set search engine in .env -> settings and have wrapper here
 import abc
+import array
+import bisect
+import fcntl
+import heapq
+import itertools
+import json
+import math
+import os
+import pickle
+import re
+import shutil
+import threading
+from collections import Counter
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils.html import escape
+
+from core.models import Reply, SearchOutbox, Thread
+from core.services.meilisearch import MeilisearchClient, enqueue, enqueue_rebuild
+from core.services.search_cache import SearchResultCache, result_cache
 
 
 class Search(abc.ABC):
+    """Search engine wrapper, ForumService feeds it on every write."""
+
     @abc.abstractmethod
-    def search(self, query: str) -> list[dict]:
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        """Return up to limit `{"thread_id": int, "score": float}` dicts, best match first."""
+        pass
+
+    def index_thread(self, thread_id: int, title: str) -> None:
         pass
 
+    def index_reply(self, reply_id: int, thread_id: int, content: str) -> None:
+        pass
 
-class SimpleSearch(Search):
-    def search(self, query: str) -> list[dict]:
+    def remove_thread(self, thread_id: int) -> None:
         pass
 
+    def remove_reply(self, reply_id: int) -> None:
+        pass
 
-class MeilisearchSearch(Search):
-    def search(self, query: str) -> list[dict]:
+    def rebuild(self) -> None:
+        """Reindex everything from the database."""
         pass
 
+    def normalize_query(self, query: str) -> str:
+        """Canonical form of query, queries normalizing alike must rank alike. Used as the result cache key."""
+        return " ".join(query.lower().split())
+
+
+class TokenSetQueryMixin:
+    """For engines matching any query token in any order, where only the set of tokens matters."""
+
+    def normalize_query(self, query: str) -> str:
+        return " ".join(sorted(set(tokenize(query))))
+
+
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such that the their then there these they "
+    "this to was will with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+class InvertedIndex:
+    """BM25 ranked inverted index over thread titles and replies.
+
+    Documents get increasing internal numbers, so posting lists are append only
+    arrays of (doc, term frequency). Removed documents are tombstoned and dropped
+    from the posting lists on compact().
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.postings: dict[str, tuple[array.array, array.array]] = {}
+        self.doc_ids: dict[str, int] = {}  # "t:<thread id>" / "r:<reply id>" -> doc.
+        self.thread_docs: dict[int, set[str]] = {}
+        self.doc_thread = array.array("Q")
+        self.doc_len = array.array("I")
+        self.deleted: set[int] = set()
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, key: str, thread_id: int, text: str) -> None:
+        if key in self.doc_ids:
+            self.remove(key)
+
+        tokens = tokenize(text)
+        doc = len(self.doc_thread)
+        self.doc_ids[key] = doc
+        self.thread_docs.setdefault(thread_id, set()).add(key)
+        self.doc_thread.append(thread_id)
+        self.doc_len.append(len(tokens))
+        self.total_len += len(tokens)
+
+        for term, tf in Counter(tokens).items():
+            docs, tfs = self.postings.setdefault(term, (array.array("Q"), array.array("I")))
+            docs.append(doc)
+            tfs.append(tf)
+
+    def remove(self, key: str) -> None:
+        doc = self.doc_ids.pop(key, None)
+        if doc is None:
+            return
+        thread_id = self.doc_thread[doc]
+        keys = self.thread_docs.get(thread_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.thread_docs[thread_id]
+        self.deleted.add(doc)
+        self.total_len -= self.doc_len[doc]
+        self.doc_len[doc] = 0
+
+    def remove_thread(self, thread_id: int) -> None:
+        for key in list(self.thread_docs.get(thread_id, ())):
+            self.remove(key)
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        """Top limit threads by their best matching document, with max-score pruning.
+
+        Terms are ordered by the most a document can get from them. Once the top threads all beat the
+        combined bound of the weakest terms, those only get looked up for documents the others matched,
+        so common terms next to rare ones cost a binary search per candidate instead of a full scan.
+        """
+        n_docs = len(self.doc_ids)
+        if not n_docs or limit <= 0:
+            return []
+        avg_len = self.total_len / n_docs or 1.0
+        doc_len = self.doc_len
+        deleted = self.deleted
+        k1, b = self.K1, self.B
+
+        terms = []
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                # Posting lists keep removed documents until compact(), capped so idf stays positive.
+                df = min(len(posting[0]), n_docs)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                # tf / (tf + norm) stays below 1, so no document gets more than this from the term.
+                terms.append((idf * (k1 + 1), idf, *posting))
+        terms.sort(key=lambda t: t[0])
+        bounds = list(itertools.accumulate(t[0] for t in terms))  # bounds[i]: most terms[:i + 1] add up to.
+        positions = [0] * len(terms)
+
+        def add_weak_terms(doc: int, score: float, norm: float, essential: int) -> float | None:
+            """score plus what terms[:essential] add for doc, None once it can not make the top."""
+            for i in range(essential - 1, -1, -1):
+                if score + bounds[i] <= top.threshold:
+                    return None
+                _, idf, docs, tfs = terms[i]
+                pos = bisect.bisect_left(docs, doc, positions[i])
+                positions[i] = pos
+                if pos < len(docs) and docs[pos] == doc:
+                    tf = tfs[pos]
+                    score += idf * tf * (k1 + 1) / (tf + norm)
+            return score
+
+        top = _TopThreads(limit)
+        essential = 0  # terms[essential:] drive the candidates, the rest only add to them.
+        while True:
+            while essential < len(terms) and bounds[essential] <= top.threshold:
+                essential += 1
+            if essential >= len(terms) - 1:
+                break
+
+            # Next candidate, the smallest document left in the essential posting lists.
+            doc = None
+            for i in range(essential, len(terms)):
+                docs, pos = terms[i][2], positions[i]
+                if pos < len(docs) and (doc is None or docs[pos] < doc):
+                    doc = docs[pos]
+            if doc is None:
+                break
+
+            norm = k1 * (1 - b + b * doc_len[doc] / avg_len)
+            score = 0.0
+            for i in range(essential, len(terms)):
+                _, idf, docs, tfs = terms[i]
+                pos = positions[i]
+                if pos < len(docs) and docs[pos] == doc:
+                    tf = tfs[pos]
+                    score += idf * tf * (k1 + 1) / (tf + norm)
+                    positions[i] = pos + 1
+            if doc not in deleted:
+                score = add_weak_terms(doc, score, norm, essential)
+                if score is not None:
+                    top.offer(self.doc_thread[doc], score)
+
+        if essential == len(terms) - 1:
+            # One list left to drive, walked without picking candidates across lists.
+            _, idf, docs, tfs = terms[essential]
+            for pos in range(positions[essential], len(docs)):
+                if bounds[essential] <= top.threshold:
+                    break
+                doc = docs[pos]
+                if doc in deleted:
+                    continue
+                tf = tfs[pos]
+                norm = k1 * (1 - b + b * doc_len[doc] / avg_len)
+                score = add_weak_terms(doc, idf * tf * (k1 + 1) / (tf + norm), norm, essential)
+                if score is not None:
+                    top.offer(self.doc_thread[doc], score)
+
+        return [{"thread_id": thread_id, "score": score} for thread_id, score in top.ranked()]
+
+    def compact(self) -> None:
+        if not self.deleted:
+            return
+        remap = {}
+        doc_thread = array.array("Q")
+        doc_len = array.array("I")
+        for doc in sorted(self.doc_ids.values()):
+            remap[doc] = len(doc_thread)
+            doc_thread.append(self.doc_thread[doc])
+            doc_len.append(self.doc_len[doc])
+
+        postings = {}
+        for term, (docs, tfs) in self.postings.items():
+            new_docs, new_tfs = array.array("Q"), array.array("I")
+            for doc, tf in zip(docs, tfs):
+                if doc in remap:
+                    new_docs.append(remap[doc])
+                    new_tfs.append(tf)
+            if new_docs:
+                postings[term] = (new_docs, new_tfs)
+
+        self.postings = postings
+        self.doc_ids = {key: remap[doc] for key, doc in self.doc_ids.items()}
+        self.doc_thread = doc_thread
+        self.doc_len = doc_len
+        self.deleted = set()
+
+    def apply(self, op: dict) -> None:
+        if op["op"] == "add":
+            self.add(op["key"], op["thread_id"], op["text"])
+        elif op["op"] == "remove":
+            self.remove(op["key"])
+        elif op["op"] == "remove_thread":
+            self.remove_thread(op["thread_id"])
+
+
+class _TopThreads:
+    """The limit best scoring threads, a thread scores as its best document."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.best: dict[int, float] = {}
+        self._heap: list[tuple[float, int]] = []  # Min heap, entries no longer in best are skipped.
+        self.threshold = 0.0  # Scores at or below it can not make it into the top anymore.
+
+    def offer(self, thread_id: int, score: float) -> None:
+        if score <= self.threshold or score <= self.best.get(thread_id, 0.0):
+            return
+        self.best[thread_id] = score
+        heapq.heappush(self._heap, (score, thread_id))
+        if len(self.best) > self.limit:
+            # Scores only grow, a dropped thread can only come back with a score above the threshold.
+            del self.best[self._pop_valid()[1]]
+        if len(self.best) == self.limit:
+            self.threshold = self._peek_valid()[0]
+
+    def ranked(self) -> list[tuple[int, float]]:
+        return sorted(self.best.items(), key=lambda item: item[1], reverse=True)
+
+    def _peek_valid(self) -> tuple[float, int]:
+        while self.best.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def _pop_valid(self) -> tuple[float, int]:
+        self._peek_valid()
+        return heapq.heappop(self._heap)
+
+
+class SimpleSearch(TokenSetQueryMixin, Search):
+    """In-process search engine, no extra services needed.
+
+    State on disk is a pickled snapshot plus an append only journal of writes
+    made since. Every worker process tails the journal before searching, so
+    writes from other processes become visible without reloading the snapshot.
+    The journal is folded into a new snapshot once it grows past COMPACT_BYTES,
+    in a background thread, searches only wait while it copies the index. The
+    file lock is only held to start and to publish a snapshot, writes made
+    meanwhile move over to the new generation's journal.
+    """
+
+    COMPACT_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path or settings.SEARCH_INDEX_DIR)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = InvertedIndex()
+        self._generation = None
+        self._offset = 0
+        self._compacting = False
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        with self._lock:
+            self._sync()
+            return self._index.search(query, limit)
+
+    def index_thread(self, thread_id: int, title: str) -> None:
+        self._write({"op": "add", "key": f"t:{thread_id}", "thread_id": thread_id, "text": title})
+
+    def index_reply(self, reply_id: int, thread_id: int, content: str) -> None:
+        self._write({"op": "add", "key": f"r:{reply_id}", "thread_id": thread_id, "text": content})
+
+    def remove_thread(self, thread_id: int) -> None:
+        self._write({"op": "remove_thread", "thread_id": thread_id})
+
+    def remove_reply(self, reply_id: int) -> None:
+        self._write({"op": "remove", "key": f"r:{reply_id}"})
+
+    def rebuild(self) -> None:
+        with self._file_lock():
+            generation = self._read_generation()
+            journal = self._journal_path(generation)
+            offset = journal.stat().st_size if journal.exists() else 0
+            # Compactions meanwhile keep their journals, the writes in them are replayed below.
+            (self.path / "REBUILDING").write_text(str(generation))
+
+        index = InvertedIndex()
+        for thread_id, title in Thread.objects.order_by().values_list("id", "title").iterator(chunk_size=2000):
+            index.add(f"t:{thread_id}", thread_id, title)
+        q = Reply.objects.filter(thread__deleted_at__isnull=True).order_by().values_list("id", "thread_id", "content")
+        for reply_id, thread_id, content in q.iterator(chunk_size=2000):
+            index.add(f"r:{reply_id}", thread_id, content)
+
+        # Replay writes committed while the database was being read, in every generation since.
+        while True:
+            with self._file_lock():
+                current = self._read_generation()
+                for g in range(generation, current + 1):
+                    offset = self._replay(index, self._journal_path(g), offset if g == generation else 0)
+            generation = current
+            if self._publish(index, generation, offset):
+                break
+
+        with self._lock:
+            # The writes copied over to the new journal are applied on the next sync.
+            self._index, self._generation, self._offset = index, generation + 1, 0
+
+        with self._file_lock():
+            (self.path / "REBUILDING").unlink(missing_ok=True)
+            for stale in self.path.glob("journal-*.jsonl"):
+                if int(stale.stem.split("-")[1]) < self._read_generation():
+                    stale.unlink(missing_ok=True)
+
+    def compact(self) -> None:
+        # Searches wait for the copy only, compacting and pickling it runs outside self._lock.
+        with self._lock:
+            with self._file_lock():
+                self._sync()
+            generation, offset = self._generation, self._offset
+            copy = pickle.dumps(self._index, protocol=pickle.HIGHEST_PROTOCOL)
+        index = pickle.loads(copy)
+        del copy
+        index.compact()
+        if self._publish(index, generation, offset):
+            with self._lock:
+                # Unless a search followed the new generation already, its journal is replayed on the next sync.
+                if self._generation == generation:
+                    self._index, self._generation, self._offset = index, generation + 1, 0
+
+    def _write(self, op: dict) -> None:
+        # Only committed writes may reach the index.
+        transaction.on_commit(partial(self._append, op), robust=True)
+
+    def _append(self, op: dict) -> None:
+        line = json.dumps(op, separators=(",", ":")) + "\n"
+        with self._file_lock():
+            journal = self._journal_path(self._read_generation())
+            with journal.open("a", encoding="utf-8") as f:
+                f.write(line)
+            too_big = journal.stat().st_size > self.COMPACT_BYTES
+
+        if too_big:
+            self._compact_in_background()
+
+    def _compact_in_background(self) -> None:
+        # Off the write path, _append runs in the writer thread.
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name="search-compact", daemon=True).start()
+
+    def _sync(self) -> None:
+        """Bring the in memory index up to date with disk, caller holds self._lock."""
+        generation = self._read_generation()
+        while generation != self._generation:
+            try:
+                self._index = self._load_snapshot(generation)
+            except FileNotFoundError:
+                # Replaced by a concurrent compaction, follow the new generation.
+                generation = self._read_generation()
+                continue
+            self._generation = generation
+            self._offset = 0
+
+        journal = self._journal_path(generation)
+        if not journal.exists() or journal.stat().st_size == self._offset:
+            return
+        self._offset = self._replay(self._index, journal, self._offset)
+
+    @staticmethod
+    def _replay(index: InvertedIndex, journal: Path, offset: int) -> int:
+        """Apply the journal's complete lines from offset on, returns the offset after them."""
+        if not journal.exists():
+            return offset
+        with journal.open("rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written, picked up on next sync.
+                index.apply(json.loads(line))
+                offset += len(line)
+        return offset
+
+    def _load_snapshot(self, generation: int) -> InvertedIndex:
+        if generation == 0:
+            return InvertedIndex()
+        return pickle.loads((self.path / f"snapshot-{generation}.pickle").read_bytes())
+
+    def _publish(self, index: InvertedIndex, generation: int, offset: int) -> bool:
+        """Save index, which holds generation's journal up to offset, as the next generation.
+
+        Pickles without the file lock. Returns False, saving nothing, when another snapshot came first.
+        """
+        new = generation + 1
+        tmp = self.path / f"snapshot-{new}.pickle.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp.write_bytes(pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+
+        with self._file_lock():
+            if self._read_generation() != generation:
+                tmp.unlink()
+                return False
+            # Writes appended while pickling start the new journal.
+            journal = self._journal_path(generation)
+            with self._journal_path(new).open("wb") as f:
+                if journal.exists():
+                    with journal.open("rb") as old:
+                        old.seek(offset)
+                        shutil.copyfileobj(old, f)
+            tmp.replace(self.path / f"snapshot-{new}.pickle")
+
+            current_tmp = self.path / "CURRENT.tmp"
+            current_tmp.write_text(str(new))
+            current_tmp.replace(self.path / "CURRENT")
+
+            (self.path / f"snapshot-{generation}.pickle").unlink(missing_ok=True)
+            if not (self.path / "REBUILDING").exists():
+                journal.unlink(missing_ok=True)
+        return True
+
+    def _read_generation(self) -> int:
+        try:
+            return int((self.path / "CURRENT").read_text())
+        except FileNotFoundError:
+            return 0
+
+    def _journal_path(self, generation: int) -> Path:
+        return self.path / f"journal-{generation}.jsonl"
+
+    def _file_lock(self):
+        return _FileLock(self.path / "lock")
+
+
+class _FileLock:
+    """Exclusive lock across processes sharing the index directory."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+class SqliteFtsSearch(TokenSetQueryMixin, Search):
+    """SQLite FTS5 search, the index is kept in sync by triggers from migration 0004.
+
+    Writes cost nothing on the Python side, so the index_* hooks are no-ops. Soft deleted
+    threads are filtered out by search() until the purge deletes their rows.
+    """
+
+    TABLE = "core_search_fts"
+    SNIPPET_TOKENS = 16
+
+    def __init__(self):
+        if connection.vendor != "sqlite":
+            raise ImproperlyConfigured("SqliteFtsSearch needs the sqlite3 database backend.")
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        match = self._match_expression(query)
+        if not match:
+            return []
+
+        # bm25() can not be used inside a window function, so rank documents in
+        # a materialized CTE first and keep each thread's best document. Soft deleted
+        # threads keep their rows until purged, they are dropped before the LIMIT through
+        # the partial index on deleted threads, which stay few.
+        ranked_sql = f"""
+            WITH hits AS MATERIALIZED (
+                SELECT rowid, thread_id, bm25({self.TABLE}) AS score
+                FROM {self.TABLE}
+                WHERE {self.TABLE} MATCH %s
+            )
+            SELECT rowid, thread_id, score FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY score) AS rn FROM hits
+            )
+            WHERE rn = 1 AND thread_id NOT IN (SELECT id FROM core_thread WHERE deleted_at IS NOT NULL)
+            ORDER BY score
+            LIMIT %s
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(ranked_sql, [match, limit])
+            ranked = cursor.fetchall()
+            if not ranked:
+                return []
+
+            # Snippets only for the winning documents.
+            rowids = [rowid for rowid, _, _ in ranked]
+            placeholders = ", ".join(["%s"] * len(rowids))
+            cursor.execute(
+                f"""
+                SELECT rowid, snippet({self.TABLE}, 0, char(2), char(3), '…', {self.SNIPPET_TOKENS})
+                FROM {self.TABLE}
+                WHERE {self.TABLE} MATCH %s AND rowid IN ({placeholders})
+                """,
+                [match, *rowids],
+            )
+            snippets = dict(cursor.fetchall())
+
+        return [
+            {
+                "thread_id": thread_id,
+                "score": -score,  # bm25() is negative, lower is better.
+                "snippet": self._highlight(snippets.get(rowid, "")),
+            }
+            for rowid, thread_id, score in ranked
+        ]
+
+    def rebuild(self) -> None:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE}")
+            # Soft deleted threads stay out, like ForumService.delete_thread leaves them.
+            cursor.execute(
+                f"INSERT INTO {self.TABLE}(rowid, body, thread_id) "
+                "SELECT id * 2 + 1, title, id FROM core_thread WHERE deleted_at IS NULL"
+            )
+            cursor.execute(
+                f"INSERT INTO {self.TABLE}(rowid, body, thread_id) SELECT id * 2, content, thread_id FROM core_reply "
+                "WHERE thread_id IN (SELECT id FROM core_thread WHERE deleted_at IS NULL)"
+            )
+            cursor.execute(f"INSERT INTO {self.TABLE}({self.TABLE}) VALUES ('optimize')")
+
+    @staticmethod
+    def _match_expression(query: str) -> str:
+        # Quote every token so user input can never be parsed as FTS5 syntax.
+        return " OR ".join(f'"{token}"' for token in tokenize(query))
+
+    @staticmethod
+    def _highlight(snippet: str) -> str:
+        return escape(snippet).replace("\x02", "<mark>").replace("\x03", "</mark>")
+
+
+class MeilisearchSearch(Search):
+    """Meilisearch backed search.
+
+    Writes only queue a SearchOutbox entry inside the caller's transaction,
+    `manage.py search_outbox_worker` pushes them to Meilisearch in batches.
+    """
+
+    # Several hits can belong to one thread, over fetch to fill the page after grouping.
+    OVERFETCH = 5
+
+    def __init__(self):
+        self.client = MeilisearchClient()
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        results = []
+        seen = set()
+        for hit in self.client.search(query, limit=limit * self.OVERFETCH):
+            if hit["thread_id"] in seen:
+                continue
+            seen.add(hit["thread_id"])
+            results.append({"thread_id": hit["thread_id"], "score": hit.get("_rankingScore", 0.0)})
+            if len(results) == limit:
+                break
+        return results
+
+    def index_thread(self, thread_id: int, title: str) -> None:
+        enqueue(SearchOutbox.KIND_THREAD, SearchOutbox.OP_UPSERT, thread_id)
+
+    def index_reply(self, reply_id: int, thread_id: int, content: str) -> None:
+        enqueue(SearchOutbox.KIND_REPLY, SearchOutbox.OP_UPSERT, reply_id)
+
+    def remove_thread(self, thread_id: int) -> None:
+        enqueue(SearchOutbox.KIND_THREAD, SearchOutbox.OP_DELETE, thread_id)
+
+    def remove_reply(self, reply_id: int) -> None:
+        enqueue(SearchOutbox.KIND_REPLY, SearchOutbox.OP_DELETE, reply_id)
+
+    def rebuild(self) -> None:
+        enqueue_rebuild()
+
+
+class CachedSearch(Search):
+    """Serves repeated queries from the search result cache, writes through start a new cache generation."""
+
+    def __init__(self, engine: Search, result_cache: SearchResultCache):
+        self.engine = engine
+        self.result_cache = result_cache
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        normalized = self.engine.normalize_query(query)
+        if not normalized:
+            return self.engine.search(query, limit=limit)
+        return self.result_cache.get_or_search(normalized, limit, self.engine.search)
+
+    def index_thread(self, thread_id: int, title: str) -> None:
+        self.engine.index_thread(thread_id=thread_id, title=title)
+        self.result_cache.invalidate_on_commit()
+
+    def index_reply(self, reply_id: int, thread_id: int, content: str) -> None:
+        self.engine.index_reply(reply_id=reply_id, thread_id=thread_id, content=content)
+        self.result_cache.invalidate_on_commit()
+
+    def remove_thread(self, thread_id: int) -> None:
+        self.engine.remove_thread(thread_id=thread_id)
+        self.result_cache.invalidate_on_commit()
+
+    def remove_reply(self, reply_id: int) -> None:
+        self.engine.remove_reply(reply_id=reply_id)
+        self.result_cache.invalidate_on_commit()
+
+    def rebuild(self) -> None:
+        self.engine.rebuild()
+        self.result_cache.invalidate_on_commit()
+
+    def normalize_query(self, query: str) -> str:
+        return self.engine.normalize_query(query)
+
+
+SEARCH_ENGINES = {
+    "simple": SimpleSearch,
+    "sqlite_fts": SqliteFtsSearch,
+    "meilisearch": MeilisearchSearch,
+}
+
+_engine: Search | None = None
+
 
 def get_search_engine() -> Search:
-    return SimpleSearch()
+    global _engine
+    if _engine is None:
+        engine = SEARCH_ENGINES[settings.SEARCH_ENGINE]()
+        _engine = CachedSearch(engine, result_cache) if settings.FORUM_SEARCH_CACHE_SIZE else engine
+    return _engine
@@ -0,0 +1,125 @@
+"""Search result cache: ranked thread id pages per normalized query.
+
+A per process LRU sits in front of the shared disk cache. Both are keyed by the index generation,
+a unique token in a small file replaced whenever the search index changes, so one small read tells
+every process whether its entries are still current. Entries also expire after a timeout, engines
+like Meilisearch apply writes a little after they were pushed.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.services import metrics
+from core.services.timing import timed
+
+
+class SearchResultCache:
+    def __init__(self, generation_file: Path, max_size: int = 1000, timeout: float = 60):
+        self.generation_file = Path(generation_file)
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, int], tuple[str, float, list[dict]]] = OrderedDict()
+        self._counts = {"memory": 0, "disk": 0, "miss": 0}
+        self._hit_seconds = 0.0  # Total lookup time of memory and disk hits.
+
+    def get_or_search(self, query: str, limit: int, search) -> list[dict]:
+        """Cached search(query, limit), query must already be normalized."""
+        with timed("search_cache"):
+            started = time.perf_counter()
+            generation = self.generation()
+            key = (query, limit)
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == generation and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._counts["memory"] += 1
+                    self._hit_seconds += time.perf_counter() - started
+                    hits = entry[2]
+                else:
+                    hits = None
+            if hits is not None:
+                metrics.inc("forum_search_cache_requests_total", {"result": "memory"})
+                return hits
+
+            disk_key = self._disk_key(generation, query, limit)
+            hits = cache.get(disk_key)
+        if hits is not None:
+            self._remember(key, generation, hits)
+            self._count("disk", time.perf_counter() - started)
+            return hits
+
+        self._count("miss")
+        hits = search(query, limit)
+        cache.set(disk_key, hits, timeout=self.timeout)
+        self._remember(key, generation, hits)
+        return hits
+
+    def generation(self) -> str:
+        """Token in the generation file, a new one with every invalidate()."""
+        # Read rather than stat'ed, inodes get reused and coarse mtimes repeat.
+        try:
+            return self.generation_file.read_text()
+        except FileNotFoundError:
+            return ""
+
+    def invalidate(self) -> None:
+        """Start a new generation, cached results of every process stop being served."""
+        self.generation_file.parent.mkdir(parents=True, exist_ok=True)
+        # Replaced whole, so readers never see a partial token. Random, processes may invalidate in the same ns.
+        fd, tmp = tempfile.mkstemp(dir=self.generation_file.parent, prefix=f"{self.generation_file.name}.")
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{time.time_ns()}-{uuid.uuid4().hex}")
+        os.replace(tmp, self.generation_file)
+
+    def invalidate_on_commit(self) -> None:
+        transaction.on_commit(self.invalidate, robust=True)
+
+    def stats(self) -> dict:
+        """Lookups of this process by result, per request lookup latency is the search_cache request phase."""
+        with self._lock:
+            counts = dict(self._counts)
+            entries = len(self._entries)
+            hit_seconds = self._hit_seconds
+        lookups = sum(counts.values())
+        hits = counts["memory"] + counts["disk"]
+        hit_rate = hits / lookups if lookups else 0.0
+        mean_hit_us = hit_seconds / hits * 1e6 if hits else 0.0
+        return {**counts, "entries": entries, "hit_rate": hit_rate, "mean_hit_us": mean_hit_us}
+
+    def _remember(self, key: tuple[str, int], generation: str, hits: list[dict]) -> None:
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.timeout, hits)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _count(self, result: str, seconds: float = 0.0) -> None:
+        with self._lock:
+            self._counts[result] += 1
+            self._hit_seconds += seconds
+        metrics.inc("forum_search_cache_requests_total", {"result": result})
+
+    @staticmethod
+    def _disk_key(generation: str, query: str, limit: int) -> str:
+        # Hashed, queries may be long or contain characters cache keys should not.
+        digest = hashlib.blake2b(f"{generation}:{limit}:{query}".encode(), digest_size=16).hexdigest()
+        return f"search:{digest}"
+
+
+result_cache = SearchResultCache(
+    generation_file=settings.FORUM_SEARCH_GENERATION_FILE,
+    max_size=settings.FORUM_SEARCH_CACHE_SIZE,
+    timeout=settings.FORUM_SEARCH_CACHE_SECONDS,
+)
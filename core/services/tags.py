@@ -0,0 +1,194 @@
+import array
+import bisect
+import heapq
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Tag, Thread, ThreadTag
+from core.services.pagination import Page
+
+MAX_TAGS_PER_THREAD = 5
+
+_lock = threading.Lock()
+# Process local name -> id cache, tag ids never change once created.
+_tag_ids: dict[str, int] = {}
+
+
+def normalize_tags(tags: list[str]) -> list[str]:
+    names = []
+    for tag in tags:
+        name = tag.strip().lower()[: Tag.MAX_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names[:MAX_TAGS_PER_THREAD]
+
+
+def get_or_create_tag_ids(names: list[str]) -> dict[str, int]:
+    """Map tag names to ids, creating missing tags with one bulk insert."""
+    ids = {name: _tag_ids[name] for name in names if name in _tag_ids}
+    missing = [name for name in names if name not in ids]
+    if not missing:
+        return ids
+
+    found = dict(Tag.objects.filter(name__in=missing).values_list("name", "id"))
+    new = [name for name in missing if name not in found]
+    if new:
+        # Concurrent writers may create the same tag, ignore and read back.
+        Tag.objects.bulk_create([Tag(name=name) for name in new], ignore_conflicts=True)
+        found.update(Tag.objects.filter(name__in=new).values_list("name", "id"))
+
+    # Only once committed, a rolled back transaction would leave ids of tags that do not exist.
+    transaction.on_commit(partial(_remember_tag_ids, found), robust=True)
+    ids.update(found)
+    return ids
+
+
+def _remember_tag_ids(found: dict[str, int]) -> None:
+    with _lock:
+        _tag_ids.update(found)
+
+
+@receiver(post_delete, sender=Tag)
+def _forget_deleted_tag(sender, instance, **kwargs):
+    with _lock:
+        _tag_ids.pop(instance.name, None)
+
+
+def set_thread_tags(thread_id: int, tags: list[str]) -> None:
+    """Replace the tags of a thread and keep per tag thread counts current, call inside a transaction."""
+    wanted = set(get_or_create_tag_ids(normalize_tags(tags)).values())
+    current = set(ThreadTag.objects.filter(thread_id=thread_id).values_list("tag_id", flat=True))
+
+    added = wanted - current
+    removed = current - wanted
+    now = timezone.now()
+
+    if removed:
+        ThreadTag.objects.filter(thread_id=thread_id, tag_id__in=removed).delete()
+        Tag.objects.filter(id__in=removed).update(thread_count=F("thread_count") - 1, modified_at=now)
+    if added:
+        ThreadTag.objects.bulk_create([ThreadTag(thread_id=thread_id, tag_id=tag_id) for tag_id in added])
+        Tag.objects.filter(id__in=added).update(thread_count=F("thread_count") + 1, modified_at=now)
+
+
+def repair_tag_counts() -> None:
+    """Recompute thread_count of every tag from ThreadTag rows."""
+    counts = ThreadTag.objects.filter(tag_id=OuterRef("id")).order_by().values("tag_id").annotate(c=Count("id"))
+    Tag.objects.update(thread_count=Coalesce(Subquery(counts.values("c")), 0), modified_at=timezone.now())
+
+
+def get_tag_cloud(limit: int = 50) -> list[Tag]:
+    return list(Tag.objects.filter(thread_count__gt=0).order_by("-thread_count", "name")[:limit])
+
+
+async def aget_tag_cloud(limit: int = 50) -> list[Tag]:
+    return [tag async for tag in Tag.objects.filter(thread_count__gt=0).order_by("-thread_count", "name")[:limit]]
+
+
+class TagIndex:
+    """Per tag sorted thread id arrays for multi tag AND/OR queries without N-way joins.
+
+    Arrays are cached keyed on the tag's modified_at, which every membership
+    change bumps, so all processes notice changes with no explicit purge.
+    """
+
+    def __init__(self, max_tags: int = 256):
+        self.max_tags = max_tags
+        self._cache: OrderedDict[int, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def thread_ids(self, tag_id: int, version) -> array.array:
+        """Ascending thread ids of a tag."""
+        with self._lock:
+            cached = self._cache.get(tag_id)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(tag_id)
+                return cached[1]
+
+        q = ThreadTag.objects.filter(tag_id=tag_id).order_by("thread_id").values_list("thread_id", flat=True)
+        ids = array.array("Q", q)
+
+        with self._lock:
+            self._cache[tag_id] = (version, ids)
+            self._cache.move_to_end(tag_id)
+            while len(self._cache) > self.max_tags:
+                self._cache.popitem(last=False)
+        return ids
+
+    def query(self, names: list[str], match_all: bool = True, limit: int = 25, cursor: str | None = None) -> Page:
+        """Threads tagged with all (or any) of names, newest first. Raises ValueError on invalid cursor."""
+        names = normalize_tags(names)
+        before = self._decode_cursor(cursor)
+
+        tags = list(Tag.objects.filter(name__in=names).order_by().values_list("id", "modified_at"))
+        if not tags or (match_all and len(tags) < len(names)):
+            return Page(items=[])
+
+        lists = [self.thread_ids(tag_id, version) for tag_id, version in tags]
+        if match_all:
+            ids = self._intersect(lists, before, limit + 1)
+        else:
+            ids = self._union(lists, before, limit + 1)
+
+        next_cursor = None
+        if len(ids) > limit:
+            ids = ids[:limit]
+            next_cursor = str(ids[-1])
+
+        threads = Thread.objects.select_related("created_by").in_bulk(ids)
+        return Page(items=[threads[i] for i in ids if i in threads], next_cursor=next_cursor)
+
+    @staticmethod
+    def _descending(ids: array.array, before: int | None):
+        end = bisect.bisect_left(ids, before) if before is not None else len(ids)
+        for i in range(end - 1, -1, -1):
+            yield ids[i]
+
+    @classmethod
+    def _intersect(cls, lists: list[array.array], before: int | None, limit: int) -> list[int]:
+        # Walk the shortest list and binary search the others, stops as soon as the page is full.
+        lists = sorted(lists, key=len)
+        shortest, others = lists[0], lists[1:]
+        ids = []
+        for thread_id in cls._descending(shortest, before):
+            for other in others:
+                i = bisect.bisect_left(other, thread_id)
+                if i == len(other) or other[i] != thread_id:
+                    break
+            else:
+                ids.append(thread_id)
+                if len(ids) == limit:
+                    break
+        return ids
+
+    @classmethod
+    def _union(cls, lists: list[array.array], before: int | None, limit: int) -> list[int]:
+        ids = []
+        merged = heapq.merge(*(cls._descending(ids_, before) for ids_ in lists), reverse=True)
+        for thread_id in merged:
+            if ids and ids[-1] == thread_id:
+                continue
+            ids.append(thread_id)
+            if len(ids) == limit:
+                break
+        return ids
+
+    @staticmethod
+    def _decode_cursor(cursor: str | None) -> int | None:
+        if not cursor:
+            return None
+        try:
+            return int(cursor)
+        except ValueError as e:
+            raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+tag_index = TagIndex()
@@ -0,0 +1,170 @@
+"""Per request timing of SQL, markdown, sanitizing and template rendering.
+
+core.middleware.timing_middleware puts a RequestTimer into a context variable for each request,
+the hooks here add to it. Outside of requests, e.g. in management commands, they only cost
+one context variable lookup.
+"""
+
+import contextlib
+import contextvars
+import os
+import sys
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+_current: contextvars.ContextVar["RequestTimer | None"] = contextvars.ContextVar("request_timer", default=None)
+
+_PROJECT_DIR = os.path.join(str(settings.BASE_DIR), "")
+_HOOK_FILES = {__file__, os.path.join(os.path.dirname(os.path.dirname(__file__)), "middleware.py")}
+
+
+class RequestTimer:
+    """Accumulated seconds and call counts per phase of one request.
+
+    SQL is grouped per statement as well. Grouping by call site walks the stack on every hook
+    call, so it is only done for sampled requests.
+    """
+
+    STATEMENT_LENGTH = 200
+
+    def __init__(self, call_sites: bool = False):
+        self.started = time.perf_counter()
+        self.call_sites = call_sites
+        self.phases: dict[str, list] = {}
+        self.statements: dict[str, list] = {}
+        self.sites: dict[str, list] = {}
+
+    def add(self, phase: str, seconds: float, statement: str | None = None) -> None:
+        _accumulate(self.phases, phase, seconds)
+        if statement is not None:
+            _accumulate(self.statements, statement[: self.STATEMENT_LENGTH], seconds)
+        if self.call_sites:
+            _accumulate(self.sites, f"{phase} {_call_site()}", seconds)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def query_count(self) -> int:
+        return self.phases.get("sql", (0, 0))[1]
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, phases overlap (template includes the sql it triggers)."""
+        metrics = [f'{phase};dur={seconds * 1000:.2f};desc="{count}x"' for phase, (seconds, count) in self.phases.items()]
+        metrics.append(f"total;dur={self.elapsed * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def as_record(self, top: int = 10) -> dict:
+        return {
+            "duration_ms": round(self.elapsed * 1000, 2),
+            "queries": self.query_count,
+            "phases": _as_breakdown(self.phases),
+            "statements": _as_breakdown(self.statements, top),
+            "call_sites": _as_breakdown(self.sites, top),
+        }
+
+
+def _accumulate(totals: dict[str, list], key: str, seconds: float) -> None:
+    entry = totals.get(key)
+    if entry is None:
+        totals[key] = [seconds, 1]
+    else:
+        entry[0] += seconds
+        entry[1] += 1
+
+
+def _as_breakdown(totals: dict[str, list], top: int | None = None) -> dict:
+    items = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {key: {"ms": round(seconds * 1000, 2), "count": count} for key, (seconds, count) in items}
+
+
+def _call_site(depth: int = 2) -> str:
+    """Innermost project frames outside the timing hooks, innermost first.
+
+    ORM calls of async code run in a worker thread whose stack ends in asgiref, those
+    report "async" as the awaiting coroutine is not on the stack.
+    """
+    sites = []
+    frame = sys._getframe(2)
+    while frame is not None and len(sites) < depth:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_DIR) and filename not in _HOOK_FILES and "site-packages" not in filename:
+            sites.append(f"{filename[len(_PROJECT_DIR):]}:{frame.f_lineno} {frame.f_code.co_name}")
+        frame = frame.f_back
+    return " < ".join(sites) or "async"
+
+
+def start_request(call_sites: bool = False) -> tuple[RequestTimer, contextvars.Token]:
+    timer = RequestTimer(call_sites=call_sites)
+    return timer, _current.set(timer)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+@contextlib.contextmanager
+def timed(phase: str):
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(phase, time.perf_counter() - started)
+
+
+def record(phase: str, seconds: float) -> None:
+    """Add time measured elsewhere to the current request's phase."""
+    timer = _current.get()
+    if timer is not None:
+        timer.add(phase, seconds)
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        timer.add("sql", elapsed, statement=sql)
+        if sql.startswith("BEGIN"):
+            # With transaction_mode IMMEDIATE writers wait for the SQLite write lock here.
+            timer.add("lock_wait", elapsed)
+
+
+@receiver(connection_created)
+def _install_sql_wrapper(sender, connection, **kwargs):
+    # Fires again on reconnects of the same connection object.
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+class _TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed("template"):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates timing top level renders, includes count towards their parent."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return _TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
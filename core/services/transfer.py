@@ -0,0 +1,262 @@
+"""JSONL export and import of forum content.
+
+One JSON object per line, its "type" is one of user, tag, thread or reply. Exports list all
+users first, then tags, threads and replies, so a line only refers to lines before it.
+"""
+
+import contextlib
+import datetime
+import time
+import uuid
+from collections.abc import Iterable, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import CustomUser, Reply, Tag, Thread, ThreadTag
+from core.services.tags import get_or_create_tag_ids, normalize_tags
+
+RECORD_TYPES = ("user", "tag", "thread", "reply")
+
+USER_FIELDS = ("email", "username", "password", "is_active", "is_staff", "is_superuser", "date_joined")
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder keeping full microsecond timestamps, reply order depends on them."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_forum(chunk_size: int = 2000) -> Iterator[dict]:
+    """All forum content as records, read with server side chunked iteration so memory stays constant."""
+    for row in CustomUser.objects.order_by("id").values(*USER_FIELDS).iterator(chunk_size=chunk_size):
+        yield {"type": "user", **row}
+
+    for name in Tag.objects.order_by("id").values_list("name", flat=True).iterator(chunk_size=chunk_size):
+        yield {"type": "tag", "name": name}
+
+    yield from _export_threads(chunk_size)
+
+    # Like threads, replies of soft deleted threads stay out, the import could not place them.
+    replies = Reply.objects.filter(thread__deleted_at__isnull=True).order_by("id").values(
+        "public_id",
+        "content",
+        "created_at",
+        "modified_at",
+        thread_public_id=F("thread__public_id"),
+        created_by_email=F("created_by__email"),
+    )
+    for row in replies.iterator(chunk_size=chunk_size):
+        yield {
+            "type": "reply",
+            "public_id": row["public_id"],
+            "thread": row["thread_public_id"],
+            "created_by": row["created_by_email"],
+            "content": row["content"],
+            "created_at": row["created_at"],
+            "modified_at": row["modified_at"],
+        }
+
+
+def _export_threads(chunk_size: int) -> Iterator[dict]:
+    # Keyset batches, so tags of a whole batch come from one query.
+    q = Thread.objects.order_by("id").values(
+        "id",
+        "public_id",
+        "title",
+        "created_at",
+        "modified_at",
+        created_by_email=F("created_by__email"),
+    )
+    last_id = 0
+    while rows := list(q.filter(id__gt=last_id)[:chunk_size]):
+        last_id = rows[-1]["id"]
+
+        tags: dict[int, list[str]] = {}
+        thread_tags = ThreadTag.objects.filter(thread_id__in=[row["id"] for row in rows]).order_by("id")
+        for thread_id, name in thread_tags.values_list("thread_id", "tag__name"):
+            tags.setdefault(thread_id, []).append(name)
+
+        for row in rows:
+            yield {
+                "type": "thread",
+                "public_id": row["public_id"],
+                "title": row["title"],
+                "created_by": row["created_by_email"],
+                "created_at": row["created_at"],
+                "modified_at": row["modified_at"],
+                "tags": tags.get(row["id"], []),
+            }
+
+
+@contextlib.contextmanager
+def _keep_timestamps():
+    """Let bulk_create store imported created_at/modified_at instead of now, for this process only."""
+    fields = [model._meta.get_field(name) for model in (Thread, Reply) for name in ("created_at", "modified_at")]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _parse_datetime(value: str | None):
+    return parse_datetime(value) if value else timezone.now()
+
+
+class ForumImporter:
+    """Bulk inserts export_forum records, batch_size records per transaction.
+
+    Only rows are written. Rendering, denormalized counters, tag counts and the search index
+    are left for one pass over everything at the end, see `manage.py import_forum`.
+    Threads and replies whose public_id already exists are skipped, so an import can be re-run.
+    """
+
+    def __init__(self, batch_size: int = 5000):
+        self.batch_size = batch_size
+        self.imported = dict.fromkeys(RECORD_TYPES, 0)
+        self.skipped = dict.fromkeys(RECORD_TYPES, 0)
+        self.elapsed = 0.0
+        self._pending: dict[str, list[dict]] = {kind: [] for kind in RECORD_TYPES}
+        self._pending_count = 0
+
+    def feed(self, records: Iterable[dict]) -> None:
+        """Import records, raises ValueError on unknown record types."""
+        started = time.perf_counter()
+        with _keep_timestamps():
+            for record in records:
+                kind = record.get("type")
+                if kind not in self._pending:
+                    raise ValueError(f"Unknown record type: {kind!r}")
+                self._pending[kind].append(record)
+                self._pending_count += 1
+                if self._pending_count >= self.batch_size:
+                    self._flush()
+            self._flush()
+        self.elapsed += time.perf_counter() - started
+
+    def _flush(self) -> None:
+        # Dependency order, a batch may hold threads and the replies referring to them.
+        with transaction.atomic():
+            self._import_users(self._pending["user"])
+            self._import_tags(self._pending["tag"])
+            self._import_threads(self._pending["thread"])
+            self._import_replies(self._pending["reply"])
+        self._pending = {kind: [] for kind in RECORD_TYPES}
+        self._pending_count = 0
+
+    def _import_users(self, records: list[dict]) -> None:
+        if not records:
+            return
+        existing = set(CustomUser.objects.filter(email__in=[r["email"] for r in records]).values_list("email", flat=True))
+        users = []
+        for record in records:
+            if record["email"] in existing:
+                # Existing accounts win, their threads are merged.
+                self.skipped["user"] += 1
+                continue
+            fields = {field: record[field] for field in USER_FIELDS if field in record}
+            fields["username"] = fields.get("username") or fields["email"]
+            fields["date_joined"] = _parse_datetime(fields.get("date_joined"))
+            users.append(CustomUser(**fields))
+        # Usernames are unique too, a clash leaves the account out. Ignored rows get no pk on SQLite, count them back.
+        CustomUser.objects.bulk_create(users, ignore_conflicts=True)
+        inserted = CustomUser.objects.filter(email__in=[user.email for user in users]).count()
+        self.imported["user"] += inserted
+        self.skipped["user"] += len(users) - inserted
+
+    def _import_tags(self, records: list[dict]) -> None:
+        names = {record["name"].strip().lower()[: Tag.MAX_LENGTH] for record in records}
+        names.discard("")
+        existing = set(Tag.objects.filter(name__in=names).values_list("name", flat=True)) if names else set()
+        if names:
+            get_or_create_tag_ids(list(names))
+        # Existing tags, blank names and duplicates are skipped.
+        inserted = len(names - existing)
+        self.imported["tag"] += inserted
+        self.skipped["tag"] += len(records) - inserted
+
+    def _import_threads(self, records: list[dict]) -> None:
+        if not records:
+            return
+        user_ids = self._user_ids({record["created_by"] for record in records})
+        public_ids = [uuid.UUID(str(record["public_id"])) for record in records]
+        existing = set(Thread.all_objects.filter(public_id__in=public_ids).values_list("public_id", flat=True))
+
+        threads = []
+        for public_id, record in zip(public_ids, records):
+            if public_id in existing or record["created_by"] not in user_ids:
+                self.skipped["thread"] += 1
+                continue
+            created_at = _parse_datetime(record.get("created_at"))
+            threads.append(Thread(
+                public_id=public_id,
+                title=record["title"],
+                created_by_id=user_ids[record["created_by"]],
+                created_at=created_at,
+                modified_at=_parse_datetime(record.get("modified_at")),
+                last_reply_at=created_at,
+            ))
+        # Titles are unique, a clashing thread is skipped along with its replies.
+        Thread.objects.bulk_create(threads, ignore_conflicts=True)
+
+        created = Thread.objects.filter(public_id__in=[thread.public_id for thread in threads])
+        thread_ids = dict(created.values_list("public_id", "id"))
+        self.imported["thread"] += len(thread_ids)
+        self.skipped["thread"] += len(threads) - len(thread_ids)
+
+        tags_by_thread = {
+            public_id: normalize_tags(record.get("tags", []))
+            for public_id, record in zip(public_ids, records)
+            if public_id in thread_ids
+        }
+        tag_ids = get_or_create_tag_ids(sorted({name for names in tags_by_thread.values() for name in names}))
+        ThreadTag.objects.bulk_create(
+            [
+                ThreadTag(thread_id=thread_ids[public_id], tag_id=tag_ids[name])
+                for public_id, names in tags_by_thread.items()
+                for name in names
+            ],
+            ignore_conflicts=True,
+        )
+
+    def _import_replies(self, records: list[dict]) -> None:
+        if not records:
+            return
+        user_ids = self._user_ids({record["created_by"] for record in records})
+        thread_ids = dict(
+            Thread.objects.filter(public_id__in={uuid.UUID(str(record["thread"])) for record in records})
+            .values_list("public_id", "id")
+        )
+        public_ids = [uuid.UUID(str(record["public_id"])) for record in records]
+        existing = set(Reply.objects.filter(public_id__in=public_ids).values_list("public_id", flat=True))
+
+        replies = []
+        for public_id, record in zip(public_ids, records):
+            thread_id = thread_ids.get(uuid.UUID(str(record["thread"])))
+            if public_id in existing or thread_id is None or record["created_by"] not in user_ids:
+                self.skipped["reply"] += 1
+                continue
+            replies.append(Reply(
+                public_id=public_id,
+                thread_id=thread_id,
+                created_by_id=user_ids[record["created_by"]],
+                content=record["content"],
+                created_at=_parse_datetime(record.get("created_at")),
+                modified_at=_parse_datetime(record.get("modified_at")),
+            ))
+        Reply.objects.bulk_create(replies)
+        self.imported["reply"] += len(replies)
+
+    @staticmethod
+    def _user_ids(emails: set[str]) -> dict[str, int]:
+        return dict(CustomUser.objects.filter(email__in=emails).values_list("email", "id"))
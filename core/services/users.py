@@ -0,0 +1,99 @@
+"""Authenticated user resolution without a database query per request.
+
+django.contrib.auth loads the user row on every request to verify the session. Here the user is
+kept in the cache for FORUM_USER_CACHE_SECONDS and the session is still verified against its
+password hash, so a password change logs other sessions out as before. Saving or deleting a user
+drops the cached copy, which covers is_active, is_staff and is_superuser. Groups and permissions
+are not cached, they are read when checked as before. QuerySet.update() sends no signals, the
+timeout bounds how long such changes take to show.
+"""
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model, load_backend
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+
+from core.models import CustomUser
+
+# Filled by ModelBackend on the instance, dropped so permissions are read fresh per request.
+_PERMISSION_CACHES = ("_perm_cache", "_user_perm_cache", "_group_perm_cache")
+
+
+def _user_key(user_id) -> str:
+    return f"auth-user:{user_id}"
+
+
+def _session_user(request) -> tuple | None:
+    """User id and backend of the session, None for anonymous or unknown backends."""
+    try:
+        user_id = get_user_model()._meta.pk.to_python(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return None
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    return user_id, backend_path
+
+
+def _remember(user) -> None:
+    for name in _PERMISSION_CACHES:
+        user.__dict__.pop(name, None)
+    cache.set(_user_key(user.pk), user, timeout=settings.FORUM_USER_CACHE_SECONDS)
+
+
+def _verified(request, user) -> bool:
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    return bool(session_hash) and constant_time_compare(session_hash, user.get_session_auth_hash())
+
+
+def get_user(request):
+    """Like django.contrib.auth.get_user() with the user row cached."""
+    session_user = _session_user(request)
+    if session_user is None:
+        return AnonymousUser()
+    user_id, backend_path = session_user
+
+    user = cache.get(_user_key(user_id))
+    if user is None:
+        user = load_backend(backend_path).get_user(user_id)
+        if user is None:
+            return AnonymousUser()
+        _remember(user)
+    if _verified(request, user):
+        return user
+    # Fallback secrets, a changed password or a stale copy, Django handles those and flushes the session.
+    cache.delete(_user_key(user_id))
+    return auth.get_user(request)
+
+
+async def aget_user(request):
+    """See get_user(), only a cache miss touches the database."""
+    session_user = _session_user(request)
+    if session_user is None:
+        return AnonymousUser()
+    user_id, backend_path = session_user
+
+    user = cache.get(_user_key(user_id))
+    if user is None:
+        user = await load_backend(backend_path).aget_user(user_id)
+        if user is None:
+            return AnonymousUser()
+        _remember(user)
+    if _verified(request, user):
+        return user
+    cache.delete(_user_key(user_id))
+    return await auth.aget_user(request)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def _forget_user(sender, instance, **kwargs):
+    key = _user_key(instance.pk)
+    cache.delete(key)
+    # Again after commit, a request in between may have cached the old row.
+    transaction.on_commit(lambda: cache.delete(key), robust=True)
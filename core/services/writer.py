@@ -0,0 +1,153 @@
+"""Per process write queue for ForumService mutations.
+
+SQLite has a single write lock. Rather than every request thread racing for it with
+BEGIN IMMEDIATE and a busy timeout, mutations are handed to one writer thread per process.
+It runs everything queued meanwhile in one transaction (group commit), each job in its own
+savepoint so a failing job only rolls back itself. When the COMMIT fails, the group's jobs are
+retried in transactions of their own. Requests wait FORUM_WRITE_TIMEOUT for their job at most.
+"""
+
+import contextvars
+import functools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.services.timing import record, timed
+
+_logger = logging.getLogger("forumukas")
+
+
+class WriteQueue:
+    def __init__(self, group_size: int = 64, timeout: float | None = None):
+        self.group_size = group_size
+        self.timeout = timeout
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def submit(self, func, *args, **kwargs):
+        """Run func in the writer thread and return its result, raises whatever func raised.
+
+        Raises TimeoutError when the job did not finish in time, it is only dropped when it had not started yet.
+        """
+        # Inline when already in the writer, or when the caller holds a transaction of its own:
+        # the writer could neither see its changes nor get the write lock it holds.
+        if threading.current_thread() is self._thread or connection.in_atomic_block:
+            return func(*args, **kwargs)
+
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, contextvars.copy_context(), func, args, kwargs))
+        with timed("write_queue"):
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                raise
+
+    def _ensure_started(self) -> None:
+        # Started lazily and again after a fork, threads do not survive fork().
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                self._thread = threading.Thread(target=self._run, name="forum-writer", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < self.group_size:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Jobs whose caller gave up waiting are cancelled, the rest can no longer be.
+            jobs = [job for job in jobs if job[0].set_running_or_notify_cancel()]
+            if jobs:
+                self._commit_group(jobs)
+
+    @staticmethod
+    def _commit_group(jobs: list[tuple]) -> None:
+        results = []
+        committed = False
+
+        def mark_committed():
+            nonlocal committed
+            committed = True
+
+        try:
+            connection.ensure_connection()
+            started = time.perf_counter()
+            with transaction.atomic():
+                # Runs first of the group's commit hooks, a later hook failing must not look like a failed COMMIT.
+                transaction.on_commit(mark_committed)
+                # BEGIN IMMEDIATE waited for the write lock on behalf of every job in the group,
+                # outside their contexts, so the SQL hook did not count it as their lock_wait.
+                lock_wait = time.perf_counter() - started
+                for future, context, func, args, kwargs in jobs:
+                    context.run(record, "lock_wait", lock_wait)
+                    try:
+                        with transaction.atomic():
+                            # The caller's context, so request timing sees the job's queries.
+                            results.append((future, context.run(func, *args, **kwargs), None))
+                    except Exception as e:
+                        results.append((future, None, e))
+        except Exception as e:
+            if committed:
+                _logger.exception("A commit hook of a write group failed.")
+                WriteQueue._resolve(results)
+                return
+            # Nothing of the group is stored. Reconnect for the next group.
+            connection.close()
+            if len(results) == len(jobs) > 1:
+                # Every job ran, so the COMMIT itself failed, e.g. on a deferred foreign key check
+                # savepoints do not catch. Retry the jobs one by one, so only the one at fault fails.
+                for job, (future, _, error) in zip(jobs, results):
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        WriteQueue._commit_group([job])
+                return
+            for future, *_ in jobs:
+                future.set_exception(e)
+            return
+
+        WriteQueue._resolve(results)
+
+    @staticmethod
+    def _resolve(results: list[tuple]) -> None:
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+write_queue = (
+    WriteQueue(group_size=settings.FORUM_WRITE_GROUP_SIZE, timeout=settings.FORUM_WRITE_TIMEOUT)
+    if settings.FORUM_WRITE_QUEUE
+    else None
+)
+
+
+def serialized_write(func):
+    """Run the decorated mutation through the write queue, when it is enabled."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if write_queue is None:
+            return func(*args, **kwargs)
+        return write_queue.submit(func, *args, **kwargs)
+
+    return wrapper
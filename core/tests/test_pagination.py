@@ -0,0 +1,94 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import CustomUser, Reply, Thread
+from core.services import search, writer
+from core.services.forum import ForumService
+from core.services.pagination import decode_cursor, encode_cursor
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+class CursorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.enterClassContext(mock.patch.object(writer, "write_queue", None))
+        cls.enterClassContext(mock.patch.object(search, "_engine", search.SqliteFtsSearch()))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email="cursors@example.com", password=None)
+        cls.threads = [
+            ForumService.create_thread(title=f"Thread {i}", content=f"Opening post {i}", tags=[], user_id=cls.user.id)
+            for i in range(7)
+        ]
+        cls.thread_pub_id = str(cls.threads[0].public_id)
+        for i in range(9):
+            ForumService.add_reply(thread_pub_id=cls.thread_pub_id, content=f"Reply {i}", user_id=cls.user.id)
+        # Ties on the ordering field are broken by id.
+        now = timezone.now()
+        Thread.objects.filter(id__in=[thread.id for thread in cls.threads[2:5]]).update(last_reply_at=now)
+        Reply.objects.filter(thread=cls.threads[0]).update(created_at=now)
+
+    @staticmethod
+    def walk(get_page) -> tuple[list, int]:
+        """Items of every page and the number of pages, following next_cursor."""
+        items, pages, cursor = [], 0, None
+        while True:
+            page = get_page(cursor)
+            items += page.items
+            pages += 1
+            if page.next_cursor is None:
+                return items, pages
+            cursor = page.next_cursor
+
+    def test_cursor_round_trip(self):
+        now = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(now, 42)), (now, 42))
+
+    def test_invalid_cursor_raises_value_error(self):
+        for cursor in ("not-a-cursor", encode_cursor(timezone.now(), 1)[:-3], "WzFd"):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    ForumService.get_threads(cursor=cursor)
+                with self.assertRaises(ValueError):
+                    ForumService.get_replies(self.thread_pub_id, cursor=cursor)
+
+    def test_unknown_order_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            ForumService.get_threads(order="random")
+
+    def test_thread_pages_cover_every_thread_once(self):
+        for order, field in (("activity", "-last_reply_at"), ("new", "-created_at")):
+            with self.subTest(order=order):
+                threads, pages = self.walk(lambda cursor: ForumService.get_threads(limit=3, cursor=cursor, order=order))
+                self.assertEqual(pages, 3)
+                self.assertEqual(
+                    [thread.id for thread in threads],
+                    list(Thread.objects.order_by(field, "-id").values_list("id", flat=True)),
+                )
+
+    def test_reply_pages_cover_every_reply_once(self):
+        replies, pages = self.walk(lambda cursor: ForumService.get_replies(self.thread_pub_id, limit=4, cursor=cursor))
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(replies), 10)
+        self.assertIn("Opening post 0", replies[0].content)
+        self.assertEqual(
+            [reply.pub_id for reply in replies],
+            [reply.pub_id for reply in Reply.objects.filter(thread=self.threads[0]).order_by("created_at", "id")],
+        )
+
+    def test_exact_last_page_has_no_cursor(self):
+        page = ForumService.get_replies(self.thread_pub_id, limit=10)
+        self.assertEqual(len(page.items), 10)
+        self.assertIsNone(page.next_cursor)
+
+    def test_cursor_is_stable_across_new_threads(self):
+        first = ForumService.get_threads(limit=3)
+        ForumService.create_thread(title="Newest", content="New", tags=[], user_id=self.user.id)
+        rest, _ = self.walk(lambda cursor: ForumService.get_threads(limit=3, cursor=cursor or first.next_cursor))
+        seen = [thread.id for thread in first.items + rest]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 7)
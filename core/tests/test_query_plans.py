@@ -0,0 +1,27 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from core.management.commands.check_query_plans import capture_queries, explain, seed
+from core.services import search, writer
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Writes run inline in the test transaction, search through the FTS tables of the test database.
+        cls.enterClassContext(mock.patch.object(writer, "write_queue", None))
+        cls.enterClassContext(mock.patch.object(search, "_engine", search.SqliteFtsSearch()))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(threads=30, replies=20)
+
+    def test_forum_queries_use_indexes(self):
+        results = explain(capture_queries())
+        self.assertTrue(results)
+        for label, sql, plan, bad in results:
+            with self.subTest(label, sql=sql):
+                self.assertEqual(bad, [], "\n".join(plan))
@@ -0,0 +1,125 @@
+import math
+import random
+import tempfile
+from collections import Counter
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core.services.search import InvertedIndex, SimpleSearch, tokenize
+
+
+def brute_force(index: InvertedIndex, query: str) -> dict[int, float]:
+    """BM25 of every document, a thread scores as its best one."""
+    docs = {doc: key for key, doc in index.doc_ids.items()}
+    avg_len = index.total_len / len(docs)
+    k1, b = index.K1, index.B
+    tfs = {doc: Counter() for doc in docs}
+    for term in set(tokenize(query)):
+        if term in index.postings:
+            for doc, tf in zip(*index.postings[term]):
+                if doc in docs:
+                    tfs[doc][term] = tf
+
+    scores = {}
+    for doc, counts in tfs.items():
+        if not counts:
+            continue
+        norm = k1 * (1 - b + b * index.doc_len[doc] / avg_len)
+        score = 0.0
+        for term, tf in counts.items():
+            df = min(len(index.postings[term][0]), len(docs))  # Counts removed documents until compact(), as the index does.
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + norm)
+        thread_id = index.doc_thread[doc]
+        scores[thread_id] = max(score, scores.get(thread_id, 0.0))
+    return scores
+
+
+class InvertedIndexTests(SimpleTestCase):
+    def test_rare_terms_rank_first(self):
+        index = InvertedIndex()
+        index.add("t:1", 1, "django sqlite tuning")
+        index.add("t:2", 2, "django templates")
+        index.add("r:1", 2, "more django")
+        index.add("t:3", 3, "postgres")
+
+        results = index.search("sqlite django", limit=10)
+        self.assertEqual([result["thread_id"] for result in results], [1, 2])
+        self.assertEqual(index.search("sqlite django", limit=1)[0]["thread_id"], 1)
+
+    def test_removed_documents_do_not_match(self):
+        index = InvertedIndex()
+        index.add("t:1", 1, "django")
+        index.add("r:1", 1, "sqlite")
+        index.add("t:2", 2, "sqlite")
+        index.remove("r:1")
+        self.assertEqual([result["thread_id"] for result in index.search("sqlite", limit=10)], [2])
+        index.remove_thread(2)
+        self.assertEqual(index.search("sqlite", limit=10), [])
+        # Re-adding a key replaces the document.
+        index.add("t:1", 1, "sqlite")
+        self.assertEqual([result["thread_id"] for result in index.search("django sqlite", limit=10)], [1])
+
+    def test_pruned_search_matches_brute_force(self):
+        rnd = random.Random(7)
+        vocabulary = [f"w{i}" for i in range(60)]
+        weights = [1 / (i + 1) for i in range(len(vocabulary))]  # w0 common, w59 rare.
+        index = InvertedIndex()
+        for doc in range(2000):
+            words = rnd.choices(vocabulary, weights, k=rnd.randint(1, 30))
+            index.add(f"r:{doc}", rnd.randint(1, 300), " ".join(words))
+        for doc in rnd.sample(range(2000), 200):
+            index.remove(f"r:{doc}")
+
+        for compacted in (False, True):
+            if compacted:
+                index.compact()
+            for query in ("w0", "w0 w1", "w0 w5 w40", "w2 w3 w4 w50", "w59 w58", "w0 w1 w2 w3 w4 w5"):
+                expected = brute_force(index, query)
+                for limit in (1, 10, 50):
+                    with self.subTest(query=query, limit=limit, compacted=compacted):
+                        results = index.search(query, limit)
+                        # Threads tied at the cut may differ, their scores may not.
+                        self.assertEqual(
+                            [round(result["score"], 9) for result in results],
+                            [round(score, 9) for score in sorted(expected.values(), reverse=True)[:limit]],
+                        )
+                        for result in results:
+                            self.assertAlmostEqual(result["score"], expected[result["thread_id"]])
+
+
+class SimpleSearchTests(TransactionTestCase):
+    # Writes reach the index from on_commit hooks, which run right away in autocommit.
+
+    def setUp(self):
+        self.path = self.enterContext(tempfile.TemporaryDirectory())
+
+    def thread_ids(self, engine: SimpleSearch, query: str) -> list[int]:
+        return [result["thread_id"] for result in engine.search(query)]
+
+    def test_other_processes_replay_the_journal(self):
+        writer, reader = SimpleSearch(self.path), SimpleSearch(self.path)
+        writer.index_thread(1, "django sqlite")
+        writer.index_reply(1, 2, "sqlite wal")
+        self.assertEqual(sorted(self.thread_ids(reader, "sqlite")), [1, 2])
+
+        writer.remove_reply(1)
+        writer.index_thread(3, "wal mode")
+        self.assertEqual(self.thread_ids(reader, "wal"), [3])
+        writer.remove_thread(1)
+        self.assertEqual(self.thread_ids(reader, "sqlite"), [])
+
+    def test_compact_keeps_every_write(self):
+        engine = SimpleSearch(self.path)
+        for thread_id in range(1, 21):
+            engine.index_thread(thread_id, f"thread {thread_id} sqlite")
+        engine.remove_thread(5)
+        engine.compact()
+        engine.index_thread(21, "thread 21 sqlite")
+
+        for reader in (engine, SimpleSearch(self.path)):
+            with self.subTest(reader=reader):
+                self.assertEqual(len(reader.search("sqlite", limit=50)), 20)
+                self.assertEqual(self.thread_ids(reader, "21"), [21])
+                self.assertEqual(self.thread_ids(reader, "5"), [])
+        self.assertTrue((engine.path / "snapshot-1.pickle").exists())
@@ -0,0 +1,110 @@
+import contextlib
+import contextvars
+import threading
+from concurrent.futures import Future
+
+from django.db import IntegrityError, transaction
+from django.test import TransactionTestCase
+
+from core.models import Reply, Tag
+from core.services.writer import WriteQueue
+
+
+def _job(func, *args):
+    future = Future()
+    future.set_running_or_notify_cancel()
+    return future, contextvars.copy_context(), func, args, {}
+
+
+class CommitGroupTests(TransactionTestCase):
+    """WriteQueue._commit_group run in the test thread, as the writer thread runs it."""
+
+    def setUp(self):
+        self.calls = []
+
+    def create_tag(self, name):
+        self.calls.append(name)
+        return Tag.objects.create(name=name).name
+
+    def fail(self, name):
+        self.calls.append(name)
+        raise ValueError(name)
+
+    def test_failing_job_rolls_back_only_itself(self):
+        jobs = [_job(self.create_tag, "a"), _job(self.fail, "b"), _job(self.create_tag, "c")]
+        WriteQueue._commit_group(jobs)
+
+        self.assertEqual(jobs[0][0].result(), "a")
+        with self.assertRaisesMessage(ValueError, "b"):
+            jobs[1][0].result()
+        self.assertEqual(jobs[2][0].result(), "c")
+        self.assertEqual(sorted(Tag.objects.values_list("name", flat=True)), ["a", "c"])
+
+    def test_failing_commit_hook_does_not_rerun_the_group(self):
+        def create_with_hook(name):
+            transaction.on_commit(lambda: self.fail(f"hook {name}"))
+            return self.create_tag(name)
+
+        jobs = [_job(create_with_hook, "a"), _job(self.create_tag, "b")]
+        with self.assertLogs("forumukas", "ERROR"):
+            WriteQueue._commit_group(jobs)
+
+        self.assertEqual([future.result() for future, *_ in jobs], ["a", "b"])
+        self.assertEqual(self.calls, ["a", "b", "hook a"])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_failed_commit_retries_jobs_one_by_one(self):
+        def create_orphan_reply():
+            # Foreign keys are checked on COMMIT, past the job's savepoint.
+            self.calls.append("orphan")
+            Reply.objects.create(thread_id=10**9, created_by_id=10**9, content="orphan")
+
+        jobs = [_job(self.create_tag, "a"), _job(create_orphan_reply), _job(self.create_tag, "b")]
+        WriteQueue._commit_group(jobs)
+
+        self.assertEqual(jobs[0][0].result(), "a")
+        with self.assertRaises(IntegrityError):
+            jobs[1][0].result()
+        self.assertEqual(jobs[2][0].result(), "b")
+        self.assertEqual(self.calls, ["a", "orphan", "b", "a", "orphan", "b"])
+        self.assertEqual(sorted(Tag.objects.values_list("name", flat=True)), ["a", "b"])
+        self.assertFalse(Reply.objects.exists())
+
+
+class WriteQueueTests(TransactionTestCase):
+    def test_submit_runs_in_the_writer_thread(self):
+        write_queue = WriteQueue(timeout=5)
+        self.assertEqual(write_queue.submit(lambda: threading.current_thread().name), "forum-writer")
+        self.assertEqual(write_queue.submit(lambda: Tag.objects.create(name="a").name), "a")
+        self.assertTrue(Tag.objects.filter(name="a").exists())
+
+    def test_submit_raises_what_the_job_raised(self):
+        write_queue = WriteQueue(timeout=5)
+        with self.assertRaises(ZeroDivisionError):
+            write_queue.submit(lambda: 1 / 0)
+
+    def test_timed_out_job_is_dropped_before_it_starts(self):
+        write_queue = WriteQueue(timeout=0.2)
+        started, release = threading.Event(), threading.Event()
+        ran = []
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        def submit_block():
+            # Times out too, unless block finished before this thread got to check.
+            with contextlib.suppress(TimeoutError):
+                write_queue.submit(block)
+
+        blocker = threading.Thread(target=submit_block)
+        blocker.start()
+        self.assertTrue(started.wait(5))
+        with self.assertRaises(TimeoutError):
+            write_queue.submit(ran.append, "dropped")
+        release.set()
+        blocker.join()
+
+        write_queue.timeout = 5
+        self.assertEqual(write_queue.submit(lambda: "next"), "next")
+        self.assertEqual(ran, [])
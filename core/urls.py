@@ -1,6 +1,6 @@
 from django.urls import path
 
-from core.views import index,  thread, new_thread, user_profile, delete_reply, _login
+from core.views import index,  thread, thread_replies, thread_all, new_thread, user_profile, delete_reply, metrics_view, cache_stats_view, _login
 
 
 urlpatterns = [
@@ -8,6 +8,10 @@ urlpatterns = [
     path("", index, name="index"),
     path("thread/new/", new_thread, name="new-thread"),
     path("thread/<str:thread_pub_id>/", thread, name="thread"),
+    path("thread/<str:thread_pub_id>/replies/", thread_replies, name="thread-replies"),
+    path("thread/<str:thread_pub_id>/all/", thread_all, name="thread-all"),
     path("user/profile/", user_profile, name="user-profile"),
+    path("metrics/", metrics_view, name="metrics"),
+    path("cache-stats/", cache_stats_view, name="cache-stats"),
     path("reply/delete/<str:thread_pub_id>/<str:reply_pub_id>/", delete_reply, name="delete-reply"),
 ]
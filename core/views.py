@@ -1,11 +1,55 @@
+import functools
+import itertools
+import hashlib
+import os
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.template.loader import get_template, render_to_string
 from django.contrib.auth import authenticate, login
 from django.contrib import messages
+from django.core.exceptions import BadRequest
+from django.core.handlers.asgi import ASGIRequest
 
-from core.models import CustomUser
+from core.models import CustomUser, Thread
+from core.routers import reset_read_only, set_read_only
+from core.services import metrics
+from core.services.cache import get_cache_stats, get_index_version, get_thread_version
 from core.services.forum import ForumService
+from core.services.search_cache import result_cache
+from core.services.tags import aget_tag_cloud, normalize_tags
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
+
+
+def _etag(request, version: int) -> str | None:
+    """Validator for a page built from cached data at version, None disables conditional GET.
+
+    Views use it without Last-Modified, a date can not tell users and csrf tokens apart.
+    """
+    if messages.get_messages(request):
+        return None  # Flash messages are rendered once, the page must not come from a browser cache.
+    csrf_token = request.META.get("CSRF_COOKIE")
+    if csrf_token is None:
+        return None  # The page will carry a token that is new to the browser.
+    # Pages differ per user (owner controls), per csrf token (forms) and per query string (cursors, filters).
+    # The token changes on login, a page cached before it would post a stale one.
+    raw = f"{version}:{request.user.pk}:{csrf_token}:{request.get_full_path()}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def _index_etag(request) -> str | None:
+    if request.GET.get("q"):
+        return None  # Search results depend on the search index, not on the listing version.
+    return _etag(request, get_index_version())
+
+
+def _thread_etag(request, thread_pub_id: str) -> str | None:
+    return _etag(request, get_thread_version(thread_pub_id))
 
 
 def _login(request):
@@ -40,21 +84,69 @@ def _login(request):
             return render(request, template, context)
 
 
+def _with_user(view):
+    """Resolve request.user up front for async views.
+
+    Validators and templates read request.user synchronously, a lazy user would be a database
+    query on the event loop. request.auser() is already cached by login_required.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+async def _arender(request, template: str, context: dict):
+    # Context processors (csrf, messages) are sync, render in a worker thread.
+    return await sync_to_async(render)(request, template, context)
+
+
 @login_required
-def index(request):
+@_with_user
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_index_etag)
+async def index(request):
     # TODO: Display threads, handle pagination and search.
     #  Later threads, search should be htmx.
     template = "core/index.html"
+    query = request.GET.get("q", "").strip()
+    order = request.GET.get("order", "activity")
+    tags = normalize_tags(request.GET.get("tags", "").split(","))
+    match = request.GET.get("match", "all")
     context = {
-        "threads": ForumService.get_threads(),
-        # "tags": Tag.objects.all(),  # TODO: Count by amount of threads.
+        "query": query,
+        "order": order,
+        "selected_tags": tags,  # A list, so the template tests membership rather than substrings.
+        "tags_param": ",".join(tags),
+        "match": match,
+        "tags": await aget_tag_cloud(),
     }
 
+    if query:
+        context["threads"] = await ForumService.asearch_threads(query=query)
+    else:
+        try:
+            if tags:
+                page = await ForumService.asearch_threads_by_tags(
+                    tags=tags,
+                    match_all=match != "any",
+                    cursor=request.GET.get("cursor"),
+                )
+            else:
+                page = await ForumService.aget_threads(cursor=request.GET.get("cursor"), order=order)
+        except ValueError as e:
+            raise BadRequest(str(e))
+        context["threads"] = page.items
+        context["next_cursor"] = page.next_cursor
+
     if request.method == "GET":
-        return render(request, template, context)
+        return await _arender(request, template, context)
 
     if request.method == "POST":
-        return render(request, template, context)
+        return await _arender(request, template, context)
 
 
 @login_required
@@ -70,7 +162,7 @@ def new_thread(request):
         thread = ForumService.create_thread(
             title=request.POST["title"],
             content=request.POST["content"],
-            tags=[],  #request.POST["tags"].split(","),
+            tags=request.POST.get("tags", "").split(","),
             user_id=request.user.id,
         )
 
@@ -79,34 +171,40 @@ def new_thread(request):
             context = {
                 "title": request.POST["title"],
                 "content": request.POST["content"],
-                #"tags": request.POST["tags"],
+                "tags": request.POST.get("tags", ""),
             }
             messages.error(request, "Thread title exists!")
             return render(request, template, context)
 
         messages.success(request, "Thread created!")
-        return redirect("thread", thread_pub_id=thread.public_id)
+        return redirect("thread", thread_pub_id=thread.pub_id)
 
 
 @login_required
-def thread(request, thread_pub_id: str):
+@_with_user
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_thread_etag)
+async def thread(request, thread_pub_id: str):
     # TODO: Thread display + add reply (content, tags?).
-    # TODO: Later load each reply via htmx lazy load.
     template = "core/thread.html"
+    try:
+        thread = await ForumService.aget_thread(thread_pub_id=thread_pub_id)
+    except Thread.DoesNotExist:
+        raise Http404("Thread not found.")
     context = {
-        "thread": ForumService.get_thread(thread_pub_id=thread_pub_id),
-        "replies": ForumService.get_replies(thread_pub_id=thread_pub_id),
+        "thread": thread,
+        **await _replies_context(request, thread_pub_id),
     }
 
     if request.method == "GET":
-        return render(request, template, context)
+        return await _arender(request, template, context)
 
     if request.method == "POST":
 
         action = request.POST["action"]
 
         if action == "create_reply":
-            ForumService.add_reply(
+            await sync_to_async(ForumService.add_reply)(
                 thread_pub_id=thread_pub_id,
                 content=request.POST["content"],
                 user_id=request.user.id,
@@ -114,7 +212,122 @@ def thread(request, thread_pub_id: str):
             messages.success(request, "Reply added!")
             return redirect("thread", thread_pub_id=thread_pub_id)
 
-        return render(request, template, context)
+        return await _arender(request, template, context)
+
+
+async def _replies_context(request, thread_pub_id: str) -> dict:
+    # An empty ?cursor= is the first page, both for is_first_page and the fragment cache key.
+    cursor = request.GET.get("cursor") or None
+    try:
+        page = await ForumService.aget_replies(
+            thread_pub_id=thread_pub_id,
+            limit=settings.FORUM_REPLIES_PER_PAGE,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise BadRequest(str(e))
+    except Thread.DoesNotExist:
+        raise Http404("Thread not found.")
+
+    return {
+        "thread_pub_id": thread_pub_id,
+        "thread_version": get_thread_version(thread_pub_id),
+        "replies": page.items,
+        "cursor": cursor,
+        "is_first_page": cursor is None,
+        "next_cursor": page.next_cursor,
+    }
+
+
+@login_required
+@_with_user
+@require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_thread_etag)
+async def thread_replies(request, thread_pub_id: str):
+    """Next batch of replies for htmx infinite scroll."""
+    return await _arender(request, "core/partials/replies.html", await _replies_context(request, thread_pub_id))
+
+
+@login_required
+@_with_user
+@require_http_methods(["GET"])
+async def thread_all(request, thread_pub_id: str):
+    """Whole thread in one page for print and archive, streamed so memory stays flat for any thread size."""
+    marker = "<!-- replies -->"
+    try:
+        thread = await ForumService.aget_thread(thread_pub_id=thread_pub_id)
+    except Thread.DoesNotExist:
+        raise Http404("Thread not found.")
+    page = await sync_to_async(render_to_string)(
+        "core/thread_all.html",
+        {"thread": thread, "replies_marker": marker},
+        request=request,
+    )
+    head, tail = page.split(marker, 1)
+    # ASGI servers would buffer a sync iterator into a list first, WSGI ones an async iterator.
+    stream = _astream_replies if isinstance(request, ASGIRequest) else _stream_replies
+    return StreamingHttpResponse(stream(head, tail, thread_pub_id))
+
+
+def _replies_renderer(thread_pub_id: str, flush_every: int):
+    """(render_chunk, close) over a thread's replies, render_chunk returns "" once all are rendered."""
+    template = get_template("core/partials/reply.html")
+    rows = ForumService.iter_replies(thread_pub_id=thread_pub_id)
+    replies = enumerate(rows)
+
+    def render_chunk() -> str:
+        # The body streams after read_replica_middleware returned, route the reply reads again.
+        token = set_read_only(True)
+        try:
+            return "".join(
+                template.render({"reply": reply, "thread_pub_id": thread_pub_id, "is_opening_post": i == 0})
+                for i, reply in itertools.islice(replies, flush_every)
+            )
+        finally:
+            reset_read_only(token)
+
+    return render_chunk, rows.close
+
+
+def _stream_replies(head: str, tail: str, thread_pub_id: str, flush_every: int = 50):
+    render_chunk, close = _replies_renderer(thread_pub_id, flush_every)
+    yield head
+    try:
+        while chunk := render_chunk():
+            yield chunk
+    finally:
+        # Closes the database cursor when the client went away mid stream.
+        close()
+    yield tail
+
+
+async def _astream_replies(head: str, tail: str, thread_pub_id: str, flush_every: int = 50):
+    render_chunk, close = _replies_renderer(thread_pub_id, flush_every)
+    yield head
+    # The reply cursor lives in the sync thread, every chunk is fetched and rendered there.
+    try:
+        while chunk := await sync_to_async(render_chunk)():
+            yield chunk
+    finally:
+        await sync_to_async(close)()
+    yield tail
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus text exposition of all worker processes, opt in with FORUM_METRICS_ENABLED."""
+    if metrics.registry is None:
+        raise Http404("Metrics are disabled.")
+    return HttpResponse(metrics.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def cache_stats_view(request):
+    """Cache hit rates of the worker process that serves the request, counters are per process."""
+    return JsonResponse({"pid": os.getpid(), "forum": get_cache_stats(), "search": result_cache.stats()})
 
 
 @login_required
@@ -131,10 +344,12 @@ def user_profile(request):
 
 
 @login_required
-@require_http_methods(["GET"])
+@require_http_methods(["POST"])
 def delete_reply(request, thread_pub_id: str, reply_pub_id: str):
-    ForumService.delete_reply(reply_pub_id=reply_pub_id, user_id=request.user.id)
-    messages.success(request, "Reply deleted!")
+    if ForumService.delete_reply(reply_pub_id=reply_pub_id, user_id=request.user.id):
+        messages.success(request, "Reply deleted!")
+    else:
+        messages.error(request, "Reply could not be deleted!")
     return redirect("thread", thread_pub_id=thread_pub_id)
 
 # TODO: Custom decorator that checks for group verified_user, if not, redirects to unverified.html!
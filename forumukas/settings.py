@@ -40,11 +40,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.timing_middleware",
+    "core.middleware.read_replica_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.CachedAuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -53,7 +55,7 @@ ROOT_URLCONF = "forumukas.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "core.services.timing.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / 'templates']
         ,
         "APP_DIRS": True,
@@ -88,9 +90,58 @@ DATABASES = {
                 PRAGMA cache_size=2000;
             """,
         },
-    }
+    },
+    # Same file opened read-only, GET requests read from it, see core.routers.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        "OPTIONS": {
+            "timeout": 5,  # seconds
+            "init_command": """
+                PRAGMA query_only=ON;
+                PRAGMA mmap_size = 134217728;
+                PRAGMA cache_size=2000;
+            """,
+        },
+        "TEST": {"MIRROR": "default"},
+    },
+}
+
+DATABASE_ROUTERS = ["core.routers.ReadReplicaRouter"]
+
+# Cache
+# https://grantjenks.com/docker/python-diskcache/djangocache.html
+
+CACHES = {
+    "default": {
+        "BACKEND": "diskcache.DjangoCache",
+        "LOCATION": BASE_DIR / ".cache" / "default",
+        "TIMEOUT": 60 * 60 * 24,
+        "SHARDS": 8,
+        "DATABASE_TIMEOUT": 0.010,  # seconds
+        "OPTIONS": {
+            "size_limit": 2**28,  # 256 MiB, least recently used entries are evicted past it.
+            "eviction_policy": "least-recently-used",
+            "statistics": 1,
+        },
+    },
+    # Sessions are not evicted, they expire with SESSION_COOKIE_AGE.
+    "sessions": {
+        "BACKEND": "diskcache.DjangoCache",
+        "LOCATION": BASE_DIR / ".cache" / "sessions",
+        "SHARDS": 8,
+        "DATABASE_TIMEOUT": 1.0,  # seconds, a timed out write would lose the login.
+        "OPTIONS": {
+            "size_limit": 2**30,
+            "eviction_policy": "none",
+        },
+    },
 }
 
+SESSION_ENGINE = "django.contrib.sessions.backends.cache"  # No django_session queries per request.
+SESSION_CACHE_ALIAS = "sessions"
+MESSAGE_STORAGE = "django.contrib.messages.storage.cookie.CookieStorage"  # Messages do not touch the session.
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -141,4 +192,47 @@ MESSAGE_TAGS = {
     messages.ERROR: 'bg-danger',
 }
 
-FORUM_NAME = "Forumukas"  # TODO: Customizable via env.
\ No newline at end of file
+FORUM_NAME = "Forumukas"  # TODO: Customizable via env.
+FORUM_REPLIES_PER_PAGE = 25  # Opening post included, the rest is lazy loaded with htmx.
+FORUM_RENDER_WORKERS = 2  # Markdown worker processes per web process, 0 renders inline without time limits.
+FORUM_RENDER_MAX_CHARS = 50_000  # Longer posts are shown as escaped plain text instead of markdown.
+FORUM_RENDER_TIMEOUT = 1.0  # Seconds per post before its worker is killed and plain text is shown.
+FORUM_RENDER_MEMORY_MB = 256  # Address space limit of each worker process, None for no limit.
+FORUM_RENDER_WAIT_TIMEOUT = 2.0  # Seconds to wait for a free worker before plain text is shown.
+FORUM_PUBLIC_ID_CACHE_SIZE = 100_000  # Per process public_id -> pk entries, about 20 MB at most.
+FORUM_USER_CACHE_SECONDS = 300  # Logged in users are cached this long, dropped when saved.
+
+# Request timing, see core.middleware.timing_middleware.
+FORUM_TIMING_HEADER = DEBUG  # Server-Timing header on every response, exposes internals so keep it off in production.
+FORUM_TIMING_SLOW_MS = 500  # Requests slower than this are logged with a breakdown, None disables.
+FORUM_TIMING_SAMPLE_RATE = 0.0  # Share of all requests logged with a per call site breakdown.
+
+# ForumService mutations go through one writer thread per process, committed in groups of up to this many.
+FORUM_WRITE_QUEUE = True
+FORUM_WRITE_GROUP_SIZE = 64
+FORUM_WRITE_TIMEOUT = 30  # Seconds a request waits for its write, raises TimeoutError past it.
+
+# Prometheus metrics at /metrics/ for staff, counted per process and merged in a shared diskcache Index.
+FORUM_METRICS_ENABLED = False
+FORUM_METRICS_DIR = BASE_DIR / ".cache" / "metrics"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "forumukas": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
+# Search
+SEARCH_ENGINE = "simple"  # One of core.services.search.SEARCH_ENGINES: simple, sqlite_fts, meilisearch.
+SEARCH_INDEX_DIR = BASE_DIR / "search_index"
+FORUM_SEARCH_CACHE_SIZE = 1000  # Result pages per process kept in memory, also on disk. 0 disables the cache.
+FORUM_SEARCH_CACHE_SECONDS = 60  # Bounds how long Meilisearch results may trail the pushed writes.
+FORUM_SEARCH_GENERATION_FILE = BASE_DIR / ".cache" / "search-generation"  # Replaced on every index write.
+MEILISEARCH_URL = "http://127.0.0.1:7700"
+MEILISEARCH_API_KEY = ""
+MEILISEARCH_INDEX = "forumukas"
\ No newline at end of file